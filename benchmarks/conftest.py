@@ -0,0 +1,51 @@
+"""Shared fixtures for the benchmark suite (see pytest.ini)."""
+
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEEDED_USERS = 1_000_000
+MAX_SEEDED_RANK = 5000
+
+
+@pytest.fixture(scope="session")
+def seeded_database(tmp_path_factory):
+    """db.database pointed at a fresh database holding SEEDED_USERS users."""
+    import db.database as database
+
+    database.close_connections()
+    database.DB = str(tmp_path_factory.mktemp("db") / "connect4.db")
+    database._schema_ready = False
+    database._histogram = None
+    database._top_cache = None
+    rng = random.Random(1)
+    with database.get_connection() as db:
+        db.executemany(
+            "INSERT INTO users(username, password, rank) VALUES (?, ?, ?)",
+            (
+                (f"user{index}", "password", rng.randrange(MAX_SEEDED_RANK))
+                for index in range(SEEDED_USERS)
+            ),
+        )
+    yield database
+    database.rank_writer.flush()
+    database.close_connections()
+
+
+@pytest.fixture(scope="session")
+def tk_root():
+    """A Tk root window, or a skip when there is no display (try xvfb-run)."""
+    from tkinter import Tk, TclError
+
+    try:
+        root = Tk()
+    except TclError as error:
+        pytest.skip(f"no display: {error}")
+    root.geometry("550x550")
+    yield root
+    root.destroy()
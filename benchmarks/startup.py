@@ -0,0 +1,97 @@
+"""Cold start benchmark for the desktop app.
+
+Launches ``main.py`` several times with ``-X importtime`` and reports how
+long the imports took and which modules cost the most. With a display it
+also reports time-to-first-frame: the wall time from spawning the
+interpreter until the login screen has been painted (see
+``main.FIRST_FRAME_ENV``). Without one, only the imports that run before
+the first frame (``main`` and the login screen) are measured.
+
+Bytecode is compiled up front and written, as on an installed kiosk, so
+the numbers do not include compiling the sources.
+
+Run ``python -m benchmarks.startup``.
+"""
+
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_FRAME_ENV = "CONNECT4_FIRST_FRAME"  # Mirrors main.FIRST_FRAME_ENV
+IMPORTS_ONLY = "import main, screens.login_screen"
+
+
+def parse_importtime(stderr):
+    """Returns ``{module: (self us, cumulative us)}`` and the top-level total."""
+    modules = {}
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative))
+        if not name.startswith("  "):  # Only top-level imports add to the total
+            total += int(cumulative)
+    return modules, total
+
+
+def launch(with_display):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if with_display:
+        env[FIRST_FRAME_ENV] = "1"
+        command = [sys.executable, "-X", "importtime", "main.py"]
+    else:
+        command = [sys.executable, "-X", "importtime", "-c", IMPORTS_ONLY]
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if with_display and "first frame" not in process.stdout:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    return elapsed, process.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    compileall.compile_dir(ROOT, quiet=1)
+    with_display = bool(os.environ.get("DISPLAY") or sys.platform != "linux")
+    if with_display:
+        try:
+            launch(True)
+        except RuntimeError as error:
+            print(f"No first frame ({error}), measuring imports only")
+            with_display = False
+
+    walls, totals, self_times = [], [], {}
+    for _ in range(args.runs):
+        wall, stderr = launch(with_display)
+        modules, total = parse_importtime(stderr)
+        walls.append(wall)
+        totals.append(total)
+        for name, (self_us, _) in modules.items():
+            self_times.setdefault(name, []).append(self_us)
+
+    label = "time to first frame" if with_display else "wall time"
+    print(f"{args.runs} runs, {len(self_times)} modules imported")
+    print(f"imports: median {statistics.median(totals) / 1000:.1f} ms")
+    print(f"{label}: median {statistics.median(walls) * 1000:.1f} ms")
+    print("slowest modules by self time (median):")
+    slowest = sorted(
+        ((statistics.median(times), name) for name, times in self_times.items()),
+        reverse=True,
+    )
+    for self_us, name in slowest[: args.top]:
+        print(f"  {self_us / 1000:7.2f} ms  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import pytest
+
+from engine.bot import choose_move, make_searcher
+from engine.game_state import GameState
+from engine.opening_book import load_book
+from engine.search import DIFFICULTY_LEVELS
+
+COLS = 7
+ROWS = 6
+# A middlegame position, out of the opening book
+POSITION = [3, 3, 2, 4, 4, 2, 5, 1, 3, 6]
+
+
+def bot_for(difficulty):
+    """choose_move arguments for a bot that has not searched anything yet."""
+    state = GameState(COLS, ROWS)
+    for col in POSITION:
+        state.play(col)
+    searcher = make_searcher(difficulty, COLS, ROWS, seed=1)
+    return (state, difficulty, searcher, load_book(COLS, ROWS))
+
+
+@pytest.mark.parametrize("difficulty", sorted(DIFFICULTY_LEVELS))
+def test_bot_move(benchmark, difficulty):
+    # A fresh bot per round so the transposition table starts cold
+    col = benchmark.pedantic(
+        choose_move,
+        setup=lambda: (bot_for(difficulty), {}),
+        rounds=3,
+    )
+    assert col is None or 0 <= col < COLS
@@ -0,0 +1,42 @@
+import itertools
+
+USERNAMES = itertools.cycle([f"user{index}" for index in range(0, 1_000_000, 997)])
+
+
+def test_update_user_rank(benchmark, seeded_database):
+    benchmark(lambda: seeded_database.update_user_rank(next(USERNAMES), 1))
+
+
+def test_login_user(benchmark, seeded_database):
+    assert benchmark(seeded_database.login_user, "user500000", "password")
+
+
+def test_leaderboard_first_page(benchmark, seeded_database):
+    assert len(benchmark(seeded_database.get_leaderboard_page)) == 20
+
+
+def test_leaderboard_deep_page(benchmark, seeded_database):
+    # Around where a reader lands after paging through half the table
+    page = benchmark(seeded_database.get_leaderboard_page, 2500, 500000)
+    assert len(page) == 20
+
+
+def test_top_players_uncached(benchmark, seeded_database):
+    def uncached():
+        seeded_database._top_cache = None
+        return seeded_database.get_top_players()
+
+    assert len(benchmark(uncached)) == seeded_database.TOP_K
+
+
+def test_user_position(benchmark, seeded_database):
+    seeded_database.get_user_position("user0")  # Builds the histogram once
+    assert benchmark(seeded_database.get_user_position, "user123456") >= 1
+
+
+def test_user_position_cold(benchmark, seeded_database):
+    def cold():
+        seeded_database._histogram = None
+        return seeded_database.get_user_position("user123456")
+
+    assert benchmark(cold) >= 1
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from engine.game_state import GameState, MIN_SIZE, MAX_SIZE
+
+ROWS = 6
+
+
+def random_game(cols, seed=1):
+    """Moves of a random game played until the board is full or won."""
+    rng = random.Random(seed)
+    state = GameState(cols, ROWS)
+    while state.legal_moves():
+        state.play(rng.choice(state.legal_moves()))
+        if state.has_won(state.last_player):
+            break
+    return state.moves
+
+
+@pytest.mark.parametrize("cols", range(MIN_SIZE, MAX_SIZE + 1))
+def test_play_undo(benchmark, cols):
+    moves = random_game(cols)
+    state = GameState(cols, ROWS)
+
+    def play_and_undo():
+        for col in moves:
+            state.play(col)
+        for _ in moves:
+            state.undo()
+
+    benchmark(play_and_undo)
+    assert not state.moves
+
+
+@pytest.mark.parametrize("cols", range(MIN_SIZE, MAX_SIZE + 1))
+def test_win_check(benchmark, cols):
+    state = GameState(cols, ROWS)
+    for col in random_game(cols):
+        state.play(col)
+
+    def check_wins():
+        threats = [
+            state.is_winning_move(col, player)
+            for player in (0, 1)
+            for col in range(cols)
+            if state.can_play(col)
+        ]
+        return threats, state.has_won(0), state.has_won(1)
+
+    benchmark(check_wins)
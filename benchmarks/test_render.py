@@ -0,0 +1,19 @@
+from boards.board import GameBoard
+
+MOVES = [3, 3, 2, 4, 4, 2, 5, 1, 3, 6, 0, 0, 1, 5]
+
+
+def test_redraw_board(benchmark, tk_root):
+    board = GameBoard(tk_root, cols=7, rows=6, bg="blue")
+    tk_root.update()
+    for col in MOVES:
+        row = board.state.play(col)
+        board.draw_piece(row, col)
+
+    def forget_size():
+        # relayout skips an unchanged size; a resize moves every item
+        board.board_canvas.size = None
+        return (), {}
+
+    benchmark.pedantic(board.redraw_board, setup=forget_size, rounds=200)
+    board.destroy()
@@ -1,4 +1,10 @@
+import time
 from tkinter import Canvas, Button, Label, Frame, messagebox
+from engine.game_state import GameState
+from boards.board_canvas import BoardCanvas
+from contants.app_const import PLAYER_COLORS
+from diagnostics.instrument import timed
+import db.database as database
 
 
 class GameBoard(Frame):
@@ -25,14 +31,16 @@ class GameBoard(Frame):
 
         self.canvas = Canvas(self, bg="blue")
         self.canvas.pack(fill="both", expand=True)
+        self.board_canvas = BoardCanvas(self.canvas, cols, rows)
 
         self.back_to_home_callback = back_to_home_callback
 
         self.exit_button = Button(self, text="Exit Game", command=self.master.quit)
         self.exit_button.pack(side="bottom", pady=10)
 
-        self.pieces = [[None for _ in range(cols)] for _ in range(rows)]
+        self.state = GameState(cols, rows)
         self.current_player = "yellow"
+        self.started_at = time.monotonic()
         self.initialize_board()
         self.bind_events()
 
@@ -40,33 +48,14 @@ class GameBoard(Frame):
         self.update_idletasks()
         self.redraw_board()
 
+    @timed("board.redraw_board")
     def redraw_board(self):
-        self.canvas.delete("all")
-        cell_width = self.canvas.winfo_width() / self.cols
-        cell_height = self.canvas.winfo_height() / self.rows
-
-        for row in range(self.rows):
-            for col in range(self.cols):
-                x1 = col * cell_width + cell_width * 0.1
-                y1 = row * cell_height + cell_height * 0.1
-                x2 = x1 + cell_width * 0.8
-                y2 = y1 + cell_height * 0.8
-                self.canvas.create_oval(x1, y1, x2, y2, fill="white", tags="slot")
-
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if self.pieces[row][col]:
-                    self.draw_piece(row, col)
+        self.board_canvas.relayout()
 
+    @timed("board.draw_piece")
     def draw_piece(self, row, col):
-        cell_width = self.canvas.winfo_width() / self.cols
-        cell_height = self.canvas.winfo_height() / self.rows
-        x1 = col * cell_width + cell_width * 0.2
-        y1 = row * cell_height + cell_height * 0.2
-        x2 = x1 + cell_width * 0.6
-        y2 = y1 + cell_height * 0.6
-        color = self.pieces[row][col]
-        self.canvas.create_oval(x1, y1, x2, y2, fill=color, tags="piece")
+        color = PLAYER_COLORS[self.state.cell(row, col)]
+        self.board_canvas.add_piece(row, col, color)
 
     def bind_events(self):
         self.canvas.bind("<Button-1>", self.process_turn)
@@ -77,59 +66,43 @@ class GameBoard(Frame):
         self.master.unbind("<Configure>")
 
     def on_resize(self, event):
-        self.redraw_board()
+        self.board_canvas.request_relayout()
 
     def process_turn(self, event):
         col = int(event.x / (self.canvas.winfo_width() / self.cols))
-        for row in reversed(range(self.rows)):
-            if not self.pieces[row][col]:
-                self.pieces[row][col] = self.current_player
-                self.draw_piece(row, col)
-                if self.check_winner(row, col):
-                    messagebox.showinfo(
-                        "Game Over", f"{self.current_player.capitalize()} wins!"
-                    )
-                    self.unbind_events()
-                    self.back_to_home_callback(self.username)
-                    return
-                self.switch_player()
-                break
+        if not self.state.can_play(col):
+            return
+        row = self.state.play(col)
+        self.draw_piece(row, col)
+        if self.check_winner():
+            self.record_game()
+            messagebox.showinfo(
+                "Game Over", f"{self.current_player.capitalize()} wins!"
+            )
+            self.unbind_events()
+            self.back_to_home_callback(self.username)
+            return
+        self.switch_player()
+
+    def record_game(self):
+        # Both sides play on this computer, so only the first is a known user
+        database.record_game(
+            self.cols,
+            self.rows,
+            self.username,
+            None,
+            self.state.last_player,
+            self.state.moves,
+            time.monotonic() - self.started_at,
+        )
 
     def switch_player(self):
         self.current_player = "red" if self.current_player == "yellow" else "yellow"
         self.turn_label.config(text=f"{self.current_player.capitalize()}'s Turn")
 
-    def check_winner(self, row, col):
-        directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-        for dr, dc in directions:
-            count = 1
-            for n in range(1, 4):
-                r = row + dr * n
-                c = col + dc * n
-                if (
-                    r < 0
-                    or r >= self.rows
-                    or c < 0
-                    or c >= self.cols
-                    or self.pieces[r][c] != self.current_player
-                ):
-                    break
-                count += 1
-            for n in range(1, 4):
-                r = row - dr * n
-                c = col - dc * n
-                if (
-                    r < 0
-                    or r >= self.rows
-                    or c < 0
-                    or c >= self.cols
-                    or self.pieces[r][c] != self.current_player
-                ):
-                    break
-                count += 1
-            if count >= 4:
-                return True
-        return False
+    @timed("board.check_winner")
+    def check_winner(self):
+        return self.state.has_won(self.state.last_player)
 
 
 def create_game_board(size, parent_window, username, back_to_home_callback):
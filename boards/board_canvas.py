@@ -0,0 +1,82 @@
+from diagnostics.instrument import timed
+
+FRAME_MS = 16  # Resize relayouts are coalesced to at most one per frame
+
+
+class BoardCanvas:
+    """Keeps the slot and piece items of a board canvas alive across resizes.
+
+    Slots are created once and pieces once per move; a resize only moves
+    the existing items with ``canvas.coords``.
+    """
+
+    def __init__(self, canvas, cols, rows):
+        self.canvas = canvas
+        self.cols = cols
+        self.rows = rows
+        self.slots = {}
+        self.pieces = {}
+        self.size = None
+        self.relayout_job = None
+        canvas.bind("<Destroy>", lambda event: self.cancel(), add="+")
+
+    def reset(self, cols, rows):
+        """Drops every item, e.g. when the board size changes."""
+        self.canvas.delete("slot", "piece")
+        self.cols = cols
+        self.rows = rows
+        self.slots = {}
+        self.pieces = {}
+        self.size = None
+
+    def cell_box(self, row, col, margin):
+        cell_width = self.size[0] / self.cols
+        cell_height = self.size[1] / self.rows
+        x1 = col * cell_width + cell_width * margin
+        y1 = row * cell_height + cell_height * margin
+        x2 = x1 + cell_width * (1 - 2 * margin)
+        y2 = y1 + cell_height * (1 - 2 * margin)
+        return x1, y1, x2, y2
+
+    @timed("board_canvas.relayout")
+    def relayout(self):
+        """Creates the slots on first use, otherwise moves every item."""
+        self.relayout_job = None
+        size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        if size == self.size:
+            return
+        self.size = size
+        coords = self.canvas.coords
+        for row in range(self.rows):
+            for col in range(self.cols):
+                box = self.cell_box(row, col, 0.1)
+                slot = self.slots.get((row, col))
+                if slot is None:
+                    self.slots[(row, col)] = self.canvas.create_oval(
+                        *box, fill="white", tags="slot"
+                    )
+                else:
+                    coords(slot, *box)
+        for (row, col), piece in self.pieces.items():
+            coords(piece, *self.cell_box(row, col, 0.2))
+
+    def request_relayout(self):
+        if self.relayout_job is None:
+            self.relayout_job = self.canvas.after(FRAME_MS, self.relayout)
+
+    def cancel(self):
+        if self.relayout_job is not None:
+            self.canvas.after_cancel(self.relayout_job)
+            self.relayout_job = None
+
+    def add_piece(self, row, col, color):
+        if self.size is None:
+            self.relayout()
+        self.pieces[(row, col)] = self.canvas.create_oval(
+            *self.cell_box(row, col, 0.2), fill=color, tags="piece"
+        )
+
+    def remove_piece(self, row, col):
+        piece = self.pieces.pop((row, col), None)
+        if piece is not None:
+            self.canvas.delete(piece)
@@ -1,6 +1,14 @@
-import random
+import threading
+import time
+import traceback
 from tkinter import Canvas, Button, Label, Frame, messagebox
 import db.database as database
+from engine.game_state import GameState
+from boards.board_canvas import BoardCanvas
+from engine.search import DEFAULT_DIFFICULTY
+from engine.opening_book import load_book
+from engine.bot import choose_move, make_searcher
+from diagnostics.instrument import timed
 
 
 class GameBoard(Frame):
@@ -11,6 +19,7 @@ class GameBoard(Frame):
         rows=6,
         username="Player",
         back_to_home_callback=None,
+        difficulty=DEFAULT_DIFFICULTY,
         **kwargs,
     ):
         super().__init__(master, **kwargs)
@@ -37,11 +46,18 @@ class GameBoard(Frame):
 
         self.canvas = Canvas(self, bg="blue")
         self.canvas.pack(fill="both", expand=True)
+        self.board_canvas = BoardCanvas(self.canvas, cols, rows)
 
-        self.exit_button = Button(self, text="Exit Game", command=self.master.quit)
+        self.exit_button = Button(self, text="Exit Game", command=self.exit_game)
         self.exit_button.pack(side="bottom", pady=10)
 
-        self.pieces = [[None for _ in range(cols)] for _ in range(rows)]
+        self.state = GameState(cols, rows)
+        self.difficulty = difficulty
+        self.searcher = make_searcher(difficulty, cols, rows)
+        self.book = load_book(cols, rows)
+        self.bot_move_job = None
+        self.search_stop = None  # Set while a bot search runs in the background
+        self.started_at = time.monotonic()
         self.initialize_board()
         self.bind_events()
 
@@ -49,28 +65,28 @@ class GameBoard(Frame):
         self.update_idletasks()  # Makes sure the canvas is ready before drawing
         self.redraw_board()
 
+    @timed("bot_board.redraw_board")
     def redraw_board(self):
-        self.canvas.delete("all")
-        cell_width = self.canvas.winfo_width() / self.cols
-        cell_height = self.canvas.winfo_height() / self.rows
-        for row in range(self.rows):
-            for col in range(self.cols):
-                x1 = col * cell_width + cell_width * 0.1
-                y1 = row * cell_height + cell_height * 0.1
-                x2 = x1 + cell_width * 0.8
-                y2 = y1 + cell_height * 0.8
-                self.canvas.create_oval(x1, y1, x2, y2, fill="white", tags="slot")
+        self.board_canvas.relayout()
 
     def bind_events(self):
         self.canvas.bind("<Button-1>", self.process_turn)
         self.master.bind("<Configure>", self.on_resize)  # Handles dynamic resizing
+        self.bind("<Destroy>", self.on_destroy)
 
     def unbind_events(self):
         self.canvas.unbind("<Button-1>")
         self.master.unbind("<Configure>")
 
     def on_resize(self, event):
-        self.redraw_board()
+        self.board_canvas.request_relayout()
+
+    def on_destroy(self, event):
+        self.cancel_bot_search()
+
+    def exit_game(self):
+        self.cancel_bot_search()
+        self.master.quit()
 
     def process_turn(self, event):
         if self.current_player != self.player_color:
@@ -79,96 +95,90 @@ class GameBoard(Frame):
         col = int(event.x / (self.canvas.winfo_width() / self.cols))
         if self.make_move(col, self.player_color):
             if self.current_player != self.player_color:
-                self.after(500, self.bot_move)
+                self.bot_move_job = self.after(500, self.bot_move)
 
     def make_move(self, col, color):
-        for row in reversed(range(self.rows)):
-            if self.pieces[row][col] is None:
-                self.pieces[row][col] = color
-                self.draw_piece(row, col, color)
-                if self.check_winner(row, col):
-                    winner = self.username if color == self.player_color else "Bot"
-                    rank = self.add_rank(winner)
-                    messagebox.showinfo(
-                        "Game Over", f"{winner} wins! You Got {rank} Points!"
-                    )
-                    self.unbind_events()
-                    self.back_to_home_callback(self.username)
-                    return False
-                self.switch_player()
-                return True
-        return False
+        if not self.state.can_play(col):
+            return False
+        row = self.state.play(col)
+        self.draw_piece(row, col, color)
+        if self.check_winner():
+            winner = self.username if color == self.player_color else "Bot"
+            rank = self.add_rank(winner)
+            self.record_game()
+            messagebox.showinfo("Game Over", f"{winner} wins! You Got {rank} Points!")
+            self.unbind_events()
+            self.back_to_home_callback(self.username)
+            return False
+        self.switch_player()
+        return True
 
     def add_rank(self, winner):
         rank = 50 if self.username == winner else 10
-        database.update_user_rank(self.username, rank)
+        database.queue_rank_update(self.username, rank)
         return rank
 
+    def record_game(self):
+        database.record_game(
+            self.cols,
+            self.rows,
+            self.username,
+            "Bot",
+            self.state.last_player,
+            self.state.moves,
+            time.monotonic() - self.started_at,
+        )
+
     def bot_move(self):
-        move = self.evaluate_best_move(self.bot_color)
+        """Starts the bot search on a worker thread so the UI stays responsive."""
+        self.bot_move_job = None
+        self.search_stop = threading.Event()
+        threading.Thread(
+            target=self.run_bot_search, args=(self.search_stop,), daemon=True
+        ).start()
+
+    def run_bot_search(self, stop_event):
+        try:
+            move = self.evaluate_best_move(stop_event)
+        except Exception:
+            # A failed solver, book or pool must not leave the bot without a move
+            traceback.print_exc()
+            move = self.fallback_move()
+        if not stop_event.is_set():
+            # Execute callback in the main thread to update the GUI
+            self.master.after(0, self.apply_bot_move, move, stop_event)
+
+    def apply_bot_move(self, move, stop_event):
+        if stop_event.is_set() or stop_event is not self.search_stop:
+            return
+        self.search_stop = None
         if move is not None:
             self.make_move(move, self.bot_color)
 
-    def evaluate_best_move(self, color):
-        opponent = "yellow" if color == "red" else "red"
-        center_column = self.cols // 2
-        best_score = -float("inf")
-        best_col = random.choice(
-            [c for c in range(self.cols) if self.pieces[0][c] is None]
-        )  # fallback to random
-
-        # Score each column
-        for col in range(self.cols):
-            if self.pieces[0][col] is not None:
-                continue  # skip full columns
-
-            row = self.get_next_open_row(col)
-            if row is None:
-                continue
-
-            # Temporarily make the move
-            self.pieces[row][col] = color
-
-            # Check if this move wins the game
-            if self.check_winner(row, col):
-                self.pieces[row][col] = None  # Undo the move
-                return col  # Return immediately if winning move found
-
-            # Evaluate blocking the opponent
-            self.pieces[row][col] = opponent
-            if self.check_winner(row, col):
-                score = 1000  # High score for blocking opponent
-            else:
-                score = 0
-
-            # Prefer center columns
-            score += (self.cols // 2 - abs(col - center_column)) * 10
-
-            # Undo the move
-            self.pieces[row][col] = None
-
-            # Choose the best column based on score
-            if score > best_score:
-                best_score = score
-                best_col = col
-
-        return best_col
-
-    def get_next_open_row(self, col):
-        """Helper function to find the next open row in the given column"""
-        for r in range(self.rows - 1, -1, -1):
-            if self.pieces[r][col] is None:
-                return r
-        return None
+    def cancel_bot_search(self):
+        if self.bot_move_job is not None:
+            self.after_cancel(self.bot_move_job)
+            self.bot_move_job = None
+        if self.search_stop is not None:
+            self.search_stop.set()
+            self.search_stop = None
+
+    @timed("bot_board.evaluate_best_move")
+    def evaluate_best_move(self, stop_event=None):
+        """Picks the bot move from solved positions, the opening book or a search."""
+        return choose_move(
+            self.state, self.difficulty, self.searcher, self.book, stop_event
+        )
+
+    def fallback_move(self):
+        """The legal column closest to the center, or None on a full board."""
+        center = (self.state.cols - 1) / 2
+        legal = self.state.legal_moves()
+        return min(legal, key=lambda col: abs(col - center)) if legal else None
 
+    @timed("bot_board.draw_piece")
     def draw_piece(self, row, col, color):
-        cell_width = self.canvas.winfo_width() / self.cols
-        cell_height = self.canvas.winfo_height() / self.rows
-        x1 = col * cell_width + cell_width * 0.2
-        y1 = row * cell_height + cell_height * 0.2
-        x2 = x1 + cell_width * 0.6
-        y2 = y1 + cell_height * 0.6
-        self.canvas.create_oval(x1, y1, x2, y2, fill=color, tags="piece")
+        self.board_canvas.add_piece(row, col, color)
 
     def switch_player(self):
         self.current_player = (
@@ -184,40 +194,18 @@ class GameBoard(Frame):
     def is_player_turn(self):
         return self.current_player == self.player_color
 
-    def check_winner(self, row, col):
-        directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-        for dr, dc in directions:
-            count = 1
-            for n in range(1, 4):
-                r = row + dr * n
-                c = col + dc * n
-                if (
-                    r < 0
-                    or r >= self.rows
-                    or c < 0
-                    or c >= self.cols
-                    or self.pieces[r][c] != self.current_player
-                ):
-                    break
-                count += 1
-            for n in range(1, 4):
-                r = row - dr * n
-                c = col - dc * n
-                if (
-                    r < 0
-                    or r >= self.rows
-                    or c < 0
-                    or c >= self.cols
-                    or self.pieces[r][c] != self.current_player
-                ):
-                    break
-                count += 1
-            if count >= 4:
-                return True
-        return False
-
-
-def create_game_board(size, parent_window, username, back_to_home_callback):
+    @timed("bot_board.check_winner")
+    def check_winner(self):
+        return self.state.has_won(self.state.last_player)
+
+
+def create_game_board(
+    size,
+    parent_window,
+    username,
+    back_to_home_callback,
+    difficulty=DEFAULT_DIFFICULTY,
+):
     for widget in parent_window.winfo_children():
         widget.destroy()
     game_board = GameBoard(
@@ -227,5 +215,6 @@ def create_game_board(size, parent_window, username, back_to_home_callback):
         bg="blue",
         username=username,
         back_to_home_callback=back_to_home_callback,
+        difficulty=difficulty,
     )
     game_board.pack(fill="both", expand=True)
@@ -1,6 +1,25 @@
+import os
 import threading
 import socket
+import time
 from tkinter import Canvas, Button, Label, Frame, messagebox
+import db.database as database
+from engine.game_state import GameState
+from boards.board_canvas import BoardCanvas
+from contants.app_const import PLAYER_COLORS
+from net import protocol
+from net.metrics import format_overlay, to_prometheus, write_prometheus
+from diagnostics.instrument import timed
+
+# The server holds a dropped player's seat for 30 seconds
+RECONNECT_SECONDS = 25
+RECONNECT_INTERVAL = 1.0
+
+METRICS_INTERVAL_MS = 1000
+# Set to a path to export connection metrics in the Prometheus text format
+METRICS_FILE = os.environ.get("CONNECT4_METRICS_FILE")
+# The protocol carries no user names, so recorded games show this opponent
+ONLINE_OPPONENT = "Online"
 
 
 class GameBoard(Frame):
@@ -13,6 +32,7 @@ class GameBoard(Frame):
         port=4000,
         username="Player",
         back_to_home_callback=None,
+        watch_match=None,
         **kwargs,
     ):
         super().__init__(master, **kwargs)
@@ -28,22 +48,32 @@ class GameBoard(Frame):
         self.username = username
         self.is_my_turn = None
         self.back_to_home_callback = back_to_home_callback
-
-        self.pieces = [[None for _ in range(self.cols)] for _ in range(self.rows)]
-        if is_host:
-            self.player_color = "yellow"
-            self.opponent_color = "red"
-            self.current_player = "yellow"
-        else:
-            self.player_color = "red"
-            self.opponent_color = "yellow"
-            self.current_player = "red"
+        # Spectators watch a server match (0 for the latest) without playing
+        self.watch_match = watch_match
+        self.spectating = watch_match is not None
+
+        self.state = GameState(self.cols, self.rows)
+        # The host always plays first with the first color
+        self.player_index = 0 if is_host else 1
+        self.player_color = PLAYER_COLORS[self.player_index]
+        self.opponent_color = PLAYER_COLORS[self.player_index ^ 1]
+        self.current_player = self.player_color
+        # Set when playing through a matchmaking server, which decides results
+        self.authoritative = False
+        self.resume_token = None
+        self.closing = False
+        self.handshake_done = False  # No pings before the peer has answered
+        self.recorded = False  # Each player records their own copy of the game
+        self.started_at = time.monotonic()
+        self.metrics_overlay = None
+        self.last_sample = None
 
         self.create_widgets()
         self.bind_events()
         self.master.protocol("WM_DELETE_WINDOW", self.on_window_close)
 
         self.setup_network()
+        self.metrics_job = self.after(METRICS_INTERVAL_MS, self.sample_metrics)
 
     def create_widgets(self):
         turn_text = (
@@ -58,6 +88,7 @@ class GameBoard(Frame):
 
         self.canvas = Canvas(self, bg="blue")
         self.canvas.pack(fill="both", expand=True)
+        self.board_canvas = BoardCanvas(self.canvas, self.cols, self.rows)
 
         self.exit_button = Button(self, text="Exit Game", command=self.close_connection)
         self.exit_button.pack(side="bottom", pady=10)
@@ -74,24 +105,70 @@ class GameBoard(Frame):
                 self.socket.bind((self.ip, self.port))
                 self.socket.listen(1)
                 self.client_socket, addr = self.socket.accept()
-                self.connection = self.client_socket
-                # After connection is established, send the number of rows
-                self.connection.sendall(str(self.rows).encode("utf-8"))
+                self.connection = protocol.FramedConnection(self.client_socket)
+                # After connection is established, announce the board size
+                self.connection.send_hello(self.cols, self.rows)
                 # Execute callback in the main thread to update the GUI
                 self.master.after(0, self.update_ui_on_connection, True)
+            elif self.spectating:
+                self.socket.connect((self.ip, self.port))
+                self.connection = protocol.FramedConnection(self.socket)
+                # The server answers with a SNAPSHOT, see load_snapshot
+                self.connection.send_watch(self.watch_match)
             else:
                 self.socket.connect((self.ip, self.port))
-                self.connection = self.socket
-                # Receive the number of rows from the server
-                rows_data = self.connection.recv(1024)  # Adjust buffer size as needed
-                rows = int(rows_data.decode("utf-8"))
-                self.pieces = [[None for _ in range(rows)] for _ in range(rows)]
+                self.connection = protocol.FramedConnection(self.socket)
+                # Ask for our board size; a peer host answers with its own
+                # HELLO, a matchmaking server with START once paired
+                self.connection.send_hello(self.cols, self.rows)
+                frames = []
+                while True:
+                    if not frames:
+                        frames = self.connection.receive()
+                        if not frames:
+                            raise protocol.ProtocolError("Connection closed by host")
+                    msg_type, seq, payload = frames.pop(0)
+                    # A server answers pings even while we wait in its queue
+                    if msg_type == protocol.PING:
+                        clock = protocol.decode_ping(payload)
+                        self.connection.send_ping(protocol.PONG, clock)
+                    elif msg_type != protocol.PONG:
+                        break
+                if msg_type == protocol.HELLO:
+                    version, cols, rows = protocol.decode_hello(payload)
+                    if version != protocol.PROTOCOL_VERSION:
+                        raise protocol.ProtocolError(
+                            f"Host speaks protocol {version}, "
+                            f"we speak {protocol.PROTOCOL_VERSION}"
+                        )
+                elif msg_type == protocol.START:
+                    seat, cols, rows, match_id, self.resume_token = (
+                        protocol.decode_start(payload)
+                    )
+                    self.master.after(
+                        0, self.master.title, f"Connect Four - game {match_id}"
+                    )
+                    self.player_index = seat
+                    self.player_color = PLAYER_COLORS[seat]
+                    self.opponent_color = PLAYER_COLORS[seat ^ 1]
+                    self.current_player = self.player_color
+                    self.authoritative = True
+                elif msg_type == protocol.ERROR:
+                    raise protocol.ProtocolError(protocol.decode_error(payload))
+                else:
+                    raise protocol.ProtocolError("Host did not send HELLO")
+                # A first move may have arrived in the same segment
+                self.pending_frames = frames
+                self.state = GameState(cols, rows)
                 self.rows = rows
-                self.cols = rows
+                self.cols = cols
 
                 # Execute callback in the main thread to update the GUI
-                self.master.after(0, self.update_ui_on_connection, False)
+                self.master.after(
+                    0, self.update_ui_on_connection, self.player_index == 0
+                )
 
+            self.handshake_done = True
             # Start receiving moves
             threading.Thread(target=self.receive_move, daemon=True).start()
 
@@ -106,6 +183,9 @@ class GameBoard(Frame):
 
     def update_ui_on_connection(self, is_host):
         """Update UI based on whether the client is a host or joining."""
+        if (self.board_canvas.cols, self.board_canvas.rows) != (self.cols, self.rows):
+            self.board_canvas.reset(self.cols, self.rows)
+            self.redraw_board()
         if is_host:
             self.turn_label.config(text=f"{self.username}'s Turn")
             self.is_my_turn = True
@@ -124,40 +204,235 @@ class GameBoard(Frame):
         self.close_connection()
 
     def receive_move(self):
+        frames = getattr(self, "pending_frames", [])
         while True:
+            if not frames:
+                try:
+                    frames = self.connection.receive()
+                except (socket.error, protocol.ProtocolError):
+                    frames = []
+            if not frames and self.authoritative and not self.closing:
+                frames = self.reconnect()
+            if not frames:
+                self.master.after(0, self.on_connection_lost)
+                return
+            for msg_type, seq, payload in frames:
+                if msg_type == protocol.MOVE and self.spectating:
+                    self.master.after(0, self.show_move, protocol.decode_move(payload))
+                elif msg_type == protocol.MOVE:
+                    col = protocol.decode_move(payload)
+                    self.process_received_move(col, time.monotonic())
+                elif msg_type == protocol.SNAPSHOT:
+                    self.master.after(0, self.load_snapshot, payload)
+                elif msg_type == protocol.GAME_OVER:
+                    message = protocol.decode_game_over(payload)
+                    self.master.after(0, self.on_game_over, message)
+                    return
+                elif msg_type == protocol.RESULT:
+                    winner = protocol.decode_result(payload)
+                    self.master.after(0, self.on_result, winner)
+                    return
+                elif msg_type == protocol.RESIGN:
+                    self.master.after(0, self.on_opponent_resigned)
+                    return
+                elif msg_type == protocol.PING:
+                    clock = protocol.decode_ping(payload)
+                    self.connection.send_ping(protocol.PONG, clock)
+                elif msg_type == protocol.PONG:
+                    self.connection.metrics.record_pong(protocol.decode_ping(payload))
+                elif msg_type == protocol.ERROR:
+                    message = protocol.decode_error(payload)
+                    self.master.after(0, self.on_connection_lost, message)
+                    return
+            frames = []
+
+    def reconnect(self):
+        """Resumes a server game after the connection dropped.
+
+        Returns the first frames of the new connection (a SNAPSHOT of the
+        moves we missed), or an empty list if the game cannot be resumed.
+        """
+        self.master.after(0, lambda: self.turn_label.config(text="Reconnecting..."))
+        deadline = time.monotonic() + RECONNECT_SECONDS
+        while time.monotonic() < deadline and not self.closing:
             try:
-                data = self.connection.recv(1024).decode()
-                if data:
-                    if "GAME OVER" in data:
-                        messagebox.showinfo(
-                            "Game Over , You Lose , ", data.split(":")[1].strip()
-                        )
-                        self.canvas.unbind("<Button-1>")
-                        self.turn_label.config(text=self.username + " Lose")
-                        self.back_to_home_callback(self.username)
-                        break
-                    else:
-                        self.process_received_move(int(data))
+                sock = socket.create_connection(
+                    (self.ip, self.port), timeout=RECONNECT_INTERVAL
+                )
+                sock.settimeout(None)
+                connection = protocol.FramedConnection(sock)
+                connection.metrics = self.connection.metrics
+                connection.send_resume(self.resume_token, len(self.state.moves))
+                frames = connection.receive()
+            except (socket.error, protocol.ProtocolError):
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+            self.socket = sock
+            self.connection = connection
+            return frames if frames and frames[0][0] == protocol.SNAPSHOT else []
+        return []
+
+    def record_game(self, result):
+        """Queues the game once, with ``result`` as in ``database.record_game``."""
+        if self.recorded or self.spectating or not self.handshake_done:
+            return
+        self.recorded = True
+        database.record_game(
+            self.cols,
+            self.rows,
+            self.username,
+            ONLINE_OPPONENT,
+            result,
+            self.state.moves,
+            time.monotonic() - self.started_at,
+        )
 
-            except socket.error:
-                messagebox.showinfo("Connection Closed", "The connection was lost.")
-                self.back_to_home_callback(self.username)
-                break
+    def on_game_over(self, message):
+        self.record_game(self.player_index ^ 1)
+        messagebox.showinfo("Game Over , You Lose , ", message)
+        self.canvas.unbind("<Button-1>")
+        self.turn_label.config(text=self.username + " Lose")
+        self.back_to_home_callback(self.username)
+
+    def on_result(self, winner):
+        self.record_game(
+            database.RESULT_DRAW if winner == protocol.NO_WINNER else winner
+        )
+        if winner == protocol.NO_WINNER:
+            message = "It's a draw!"
+        elif self.spectating:
+            message = PLAYER_COLORS[winner].capitalize() + " Wins!"
+        elif winner == self.player_index:
+            message = self.username + " Win!"
+        else:
+            message = self.username + " Lose"
+        messagebox.showinfo("Game Over", message)
+        self.canvas.unbind("<Button-1>")
+        self.turn_label.config(text=message)
+        self.back_to_home_callback(self.username)
+
+    def on_opponent_resigned(self):
+        self.record_game(database.RESULT_ABANDONED)
+        if self.spectating:
+            messagebox.showinfo("Game Over", "A player left the game.")
+        else:
+            messagebox.showinfo("Game Over", "Your opponent left the game. You Win!")
+        self.canvas.unbind("<Button-1>")
+        self.back_to_home_callback(self.username)
+
+    def on_connection_lost(self, message="The connection was lost."):
+        self.record_game(database.RESULT_ABANDONED)
+        messagebox.showinfo("Connection Closed", message)
+        self.back_to_home_callback(self.username)
+
+    def load_snapshot(self, payload):
+        """Brings the board in line with a server SNAPSHOT.
+
+        Moves before the snapshot's first index are kept and anything after
+        it is replaced by the server's moves, so catching up after falling
+        behind or reconnecting costs only the moves that were missed.
+        """
+        cols, rows, first, moves = protocol.decode_snapshot(payload)
+        if (cols, rows) != (self.cols, self.rows):
+            self.state = GameState(cols, rows)
+            self.cols = cols
+            self.rows = rows
+            self.board_canvas.reset(cols, rows)
+            self.redraw_board()
+        while len(self.state.moves) > first:
+            col = self.state.moves[-1]
+            row = next(
+                row for row in range(rows) if self.state.cell(row, col) is not None
+            )
+            self.state.undo()
+            self.board_canvas.remove_piece(row, col)
+        for col in moves:
+            self.show_move(col)
+        if self.spectating:
+            self.turn_label.config(text="Spectating")
+        else:
+            self.is_my_turn = self.state.current_player == self.player_index
+            self.turn_label.config(
+                text=(
+                    self.username + " Turn"
+                    if self.is_my_turn
+                    else "Waiting for Opponent..."
+                )
+            )
+
+    def show_move(self, col):
+        player = self.state.current_player
+        row = self.state.play(col)
+        self.draw_piece(row, col, PLAYER_COLORS[player])
+
+    def process_received_move(self, col, received):
+        self.master.after(0, self.apply_received_move, col, received)
+
+    def apply_received_move(self, col, received):
+        self.connection.metrics.record_dispatch(received)
+        self.make_move(col, self.opponent_color)
+
+    def sample_metrics(self):
+        """Pings the peer once a second and refreshes the overlay and file."""
+        now = time.monotonic()
+        connection = getattr(self, "connection", None)
+        if connection is not None:
+            if self.last_sample is not None:
+                expected = METRICS_INTERVAL_MS / 1000
+                connection.metrics.record_loop_lag(now - self.last_sample - expected)
+            if self.handshake_done and not self.spectating:
+                try:
+                    connection.send_ping()
+                except socket.error:
+                    pass
+            values = connection.metrics.snapshot(connection.sock)
+            if self.metrics_overlay is not None:
+                self.canvas.itemconfigure(
+                    self.metrics_overlay, text=format_overlay(values)
+                )
+                self.canvas.tag_raise(self.metrics_overlay)
+            if METRICS_FILE:
+                text = to_prometheus(values, labels={"user": self.username})
+                write_prometheus(METRICS_FILE, text)
+        self.last_sample = now
+        self.metrics_job = self.after(METRICS_INTERVAL_MS, self.sample_metrics)
+
+    def toggle_metrics(self, event=None):
+        if self.metrics_overlay is None:
+            self.metrics_overlay = self.canvas.create_text(
+                8,
+                8,
+                anchor="nw",
+                fill="white",
+                font=("Courier", 10),
+                text="Collecting metrics...",
+            )
+        else:
+            self.canvas.delete(self.metrics_overlay)
+            self.metrics_overlay = None
 
-    def process_received_move(self, col):
-        self.master.after(0, lambda: self.make_move(col, self.opponent_color))
+    def on_destroy(self, event):
+        if self.metrics_job is not None:
+            self.after_cancel(self.metrics_job)
+            self.metrics_job = None
+        self.master.unbind("<F3>")
 
     def process_turn(self, event):
         if not self.is_my_turn:
             return
 
         col = int(event.x / (self.canvas.winfo_width() / self.cols))
+        if not self.state.can_play(col):
+            return
         if self.make_move(col, self.current_player):
-            self.connection.sendall(str(col).encode())
+            try:
+                self.connection.send_move(col)
+            except socket.error:
+                pass  # The receive thread reconnects and resyncs the board
             self.is_my_turn = False
             self.turn_label.config(text="Waiting for Opponent...")
         else:
-            self.connection.sendall(str(col).encode())
+            self.connection.send_move(col)
             self.send_game_over(self.username + " Win")
 
     def switch_player(self):
@@ -168,6 +443,13 @@ class GameBoard(Frame):
         self.turn_label.config(text=turn_text)
 
     def close_connection(self):
+        self.closing = True
+        self.record_game(database.RESULT_ABANDONED)  # Unless it already ended
+        if hasattr(self, "connection") and not self.spectating:
+            try:
+                self.connection.send(protocol.RESIGN)
+            except socket.error:
+                pass
         if hasattr(self, "client_socket"):
             self.client_socket.close()
         self.socket.close()
@@ -177,91 +459,58 @@ class GameBoard(Frame):
         self.update_idletasks()  # Makes sure the canvas is ready before drawing
         self.redraw_board()
 
+    @timed("online_board.redraw_board")
     def redraw_board(self):
-        self.canvas.delete("all")  # Clears the canvas for redrawing
-        cell_width = self.canvas.winfo_width() / self.cols
-        cell_height = self.canvas.winfo_height() / self.rows
-        for row in range(self.rows):
-            for col in range(self.cols):
-                x1 = col * cell_width + cell_width * 0.1
-                y1 = row * cell_height + cell_height * 0.1
-                x2 = x1 + cell_width * 0.8
-                y2 = y1 + cell_height * 0.8
-                self.canvas.create_oval(x1, y1, x2, y2, fill="white", tags="slot")
-                if (
-                    self.pieces[row][col] is not None
-                ):  # Only draw if there's a piece there
-                    self.draw_piece(row, col, self.pieces[row][col])
+        self.board_canvas.relayout()
 
     def bind_events(self):
         self.canvas.bind("<Button-1>", self.process_turn)
         self.master.bind("<Configure>", self.on_resize)
+        # F3 shows the network metrics overlay
+        self.master.bind("<F3>", self.toggle_metrics)
+        self.bind("<Destroy>", self.on_destroy)
 
     def on_resize(self, event):
-        self.redraw_board()
+        self.board_canvas.request_relayout()
 
     def make_move(self, col, color):
-        for row in reversed(range(self.rows)):
-            if self.pieces[row][col] is None:
-                self.pieces[row][col] = color
-                self.draw_piece(row, col, color)
-                if self.check_winner(row, col):
-                    winner = self.username + " Win!"
-                    messagebox.showinfo("Game Over", winner)
-                    self.canvas.unbind("<Button-1>")
-                    self.back_to_home_callback(self.username)
-                    return False
-                self.switch_player()
-                return True
-        return False
+        if not self.state.can_play(col):
+            return False
+        row = self.state.play(col)
+        self.draw_piece(row, col, color)
+        # A server pushes the result itself, see on_result
+        if not self.authoritative and self.check_winner():
+            self.record_game(self.player_index)
+            winner = self.username + " Win!"
+            messagebox.showinfo("Game Over", winner)
+            self.canvas.unbind("<Button-1>")
+            self.back_to_home_callback(self.username)
+            return False
+        self.switch_player()
+        return True
 
     def send_game_over(self, message):
-        self.connection.sendall(f"GAME OVER: {message}".encode())
+        self.connection.send_game_over(message)
 
+    @timed("online_board.draw_piece")
     def draw_piece(self, row, col, color):
-        cell_width = self.canvas.winfo_width() / self.cols
-        cell_height = self.canvas.winfo_height() / self.rows
-        x1 = col * cell_width + cell_width * 0.2
-        y1 = row * cell_height + cell_height * 0.2
-        x2 = x1 + cell_width * 0.6
-        y2 = y1 + cell_height * 0.6
-        self.canvas.create_oval(x1, y1, x2, y2, fill=color, tags=f"piece{row}{col}")
-
-    def check_winner(self, row, col):
-        directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-        for dr, dc in directions:
-            count = 1
-            for n in range(1, 4):
-                r = row + dr * n
-                c = col + dc * n
-                if (
-                    r < 0
-                    or r >= self.rows
-                    or c < 0
-                    or c >= self.cols
-                    or self.pieces[r][c] != self.current_player
-                ):
-                    break
-                count += 1
-            for n in range(1, 4):
-                r = row - dr * n
-                c = col - dc * n
-                if (
-                    r < 0
-                    or r >= self.rows
-                    or c < 0
-                    or c >= self.cols
-                    or self.pieces[r][c] != self.current_player
-                ):
-                    break
-                count += 1
-            if count >= 4:
-                return True
-        return False
+        self.board_canvas.add_piece(row, col, color)
+
+    @timed("online_board.check_winner")
+    def check_winner(self):
+        # Only our own wins are detected locally, the opponent announces theirs
+        return self.state.has_won(self.player_index)
 
 
 def create_game_board(
-    size, parent_window, isHost, ip, port, username, back_to_home_callback
+    size,
+    parent_window,
+    isHost,
+    ip,
+    port,
+    username,
+    back_to_home_callback,
+    watch_match=None,
 ):
     game_board = GameBoard(
         parent_window,
@@ -271,5 +520,6 @@ def create_game_board(
         port=port,
         username=username,
         back_to_home_callback=back_to_home_callback,
+        watch_match=watch_match,
     )
     game_board.pack(fill="both", expand=True)
@@ -0,0 +1,291 @@
+import threading
+import time
+from collections import OrderedDict
+from tkinter import Canvas, Button, Label, Frame, Listbox, Scrollbar
+import db.database as database
+from engine.game_state import GameState
+from engine.search import Searcher, WIN_SCORE
+from boards.board_canvas import BoardCanvas
+from contants.app_const import PLAYER_COLORS
+
+ANALYSIS_SECONDS = 0.5  # Search time per position
+ANALYSIS_CACHE_SIZE = 4096  # Positions kept across the games opened
+# The next page of games is fetched once the list is scrolled this far down
+LOAD_MORE_FRACTION = 0.9
+
+# (cols, rows, moves so far) -> (best column, score) for the player to move,
+# or None once the game is over. Shared by every replay, most recent last.
+_analysis_cache = OrderedDict()
+_analysis_lock = threading.Lock()
+
+
+def cached_analysis(key):
+    with _analysis_lock:
+        if key not in _analysis_cache:
+            return False, None
+        _analysis_cache.move_to_end(key)
+        return True, _analysis_cache[key]
+
+
+def store_analysis(key, result):
+    with _analysis_lock:
+        _analysis_cache[key] = result
+        if len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+
+def describe_game(summary):
+    game_id, cols, rows, opponent, result, played_at = summary
+    if result == database.RESULT_DRAW:
+        outcome = "Draw"
+    elif result == database.RESULT_ABANDONED:
+        outcome = "Abandoned"
+    else:
+        outcome = f"{PLAYER_COLORS[result].capitalize()} won"
+    day = time.strftime("%Y-%m-%d", time.localtime(played_at))
+    return f"#{game_id}  {day}  vs {opponent or 'Local'}  {cols}x{rows}  {outcome}"
+
+
+class ReplayBoard(Frame):
+    """Steps through recorded games and optionally analyzes each position.
+
+    The game list is read a page at a time as it is scrolled, and a game's
+    moves only when it is opened. Stepping adds or removes a single piece.
+    """
+
+    def __init__(self, master, username="Player", back_to_home_callback=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.username = username
+        self.back_to_home_callback = back_to_home_callback
+        self.pack(fill="both", expand=True)
+        self.configure(bg="blue")
+
+        list_frame = Frame(self, bg="blue")
+        list_frame.pack(side="top", fill="x", padx=10, pady=10)
+        self.scrollbar = Scrollbar(list_frame)
+        self.scrollbar.pack(side="right", fill="y")
+        self.game_list = Listbox(
+            list_frame, height=6, yscrollcommand=self.on_list_scroll
+        )
+        self.game_list.pack(side="left", fill="x", expand=True)
+        self.scrollbar.config(command=self.game_list.yview)
+        self.game_list.bind("<<ListboxSelect>>", self.on_select)
+
+        self.status_label = Label(
+            self, text="Pick a game", font=("Arial", 14), bg="blue", fg="white"
+        )
+        self.status_label.pack(side="top", fill="x")
+        self.analysis_label = Label(
+            self, text="", font=("Arial", 12), bg="blue", fg="white"
+        )
+        self.analysis_label.pack(side="top", fill="x")
+
+        self.canvas = Canvas(self, bg="blue")
+        self.canvas.pack(fill="both", expand=True)
+        self.board_canvas = BoardCanvas(self.canvas, 7, 6)
+
+        controls = Frame(self, bg="blue")
+        controls.pack(side="bottom", pady=10)
+        for text, command in (
+            ("|<", self.first),
+            ("<", self.back),
+            (">", self.forward),
+            (">|", self.last),
+        ):
+            Button(controls, text=text, width=3, command=command).pack(side="left")
+        self.analyze_button = Button(
+            controls, text="Analyze: Off", command=self.toggle_analysis
+        )
+        self.analyze_button.pack(side="left", padx=10)
+        Button(controls, text="Back", command=self.exit_replay).pack(side="left")
+
+        self.summaries = []
+        self.all_loaded = False
+        self.game = None
+        self.state = None
+        self.ply = 0
+        self.analyzing = False
+        self.analysis_stop = None  # Set while an analysis thread runs
+        self.load_page()
+        self.bind_events()
+
+    def bind_events(self):
+        self.master.bind("<Configure>", self.on_resize)
+        self.master.bind("<Left>", lambda event: self.back())
+        self.master.bind("<Right>", lambda event: self.forward())
+        self.bind("<Destroy>", self.on_destroy)
+
+    def unbind_events(self):
+        for sequence in ("<Configure>", "<Left>", "<Right>"):
+            self.master.unbind(sequence)
+
+    def on_resize(self, event):
+        self.board_canvas.request_relayout()
+
+    def on_destroy(self, event):
+        self.stop_analysis()
+
+    def exit_replay(self):
+        self.stop_analysis()
+        self.unbind_events()
+        self.back_to_home_callback(self.username)
+
+    def load_page(self):
+        before_id = self.summaries[-1][0] if self.summaries else None
+        page = database.get_games_page(self.username, before_id)
+        if len(page) < database.GAME_PAGE_SIZE:
+            self.all_loaded = True
+        for summary in page:
+            self.summaries.append(summary)
+            self.game_list.insert("end", describe_game(summary))
+        if not self.summaries:
+            self.status_label.config(text="No recorded games yet")
+
+    def on_list_scroll(self, top, bottom):
+        self.scrollbar.set(top, bottom)
+        if not self.all_loaded and float(bottom) >= LOAD_MORE_FRACTION:
+            self.load_page()
+
+    def on_select(self, event):
+        selection = self.game_list.curselection()
+        if selection:
+            self.open_game(self.summaries[selection[0]][0])
+
+    def open_game(self, game_id):
+        self.stop_analysis()
+        self.game = database.get_game(game_id)
+        self.state = GameState(self.game.cols, self.game.rows)
+        self.ply = 0
+        self.board_canvas.reset(self.game.cols, self.game.rows)
+        self.board_canvas.relayout()
+        self.show_position()
+        if self.analyzing:
+            self.start_analysis()
+
+    def forward(self):
+        if self.game is None or self.ply == len(self.game.moves):
+            return
+        col = self.game.moves[self.ply]
+        row = self.state.play(col)
+        self.board_canvas.add_piece(row, col, PLAYER_COLORS[self.state.last_player])
+        self.ply += 1
+        self.show_position()
+
+    def back(self):
+        if self.game is None or self.ply == 0:
+            return
+        col = self.state.undo()
+        # The freed cell is now the next free one in that column
+        row = self.state.rows - 1 - (self.state.height[col] - col * self.state.stride)
+        self.board_canvas.remove_piece(row, col)
+        self.ply -= 1
+        self.show_position()
+
+    def first(self):
+        while self.game is not None and self.ply > 0:
+            self.back()
+
+    def last(self):
+        while self.game is not None and self.ply < len(self.game.moves):
+            self.forward()
+
+    def position_key(self, ply):
+        return (self.game.cols, self.game.rows, self.game.moves[:ply])
+
+    def show_position(self):
+        self.status_label.config(
+            text=f"Game #{self.game.id}: move {self.ply} of {len(self.game.moves)}"
+        )
+        self.show_analysis()
+
+    def show_analysis(self):
+        if not self.analyzing or self.game is None:
+            self.analysis_label.config(text="")
+            return
+        found, result = cached_analysis(self.position_key(self.ply))
+        if not found:
+            text = "Analyzing..."
+        elif result is None:
+            text = "Game over"
+        else:
+            col, score = result
+            to_move = PLAYER_COLORS[self.ply & 1].capitalize()
+            cells = self.game.cols * self.game.rows
+            if score >= WIN_SCORE - cells:
+                verdict = f"{to_move} wins"
+            elif score <= cells - WIN_SCORE:
+                verdict = f"{to_move} loses"
+            else:
+                verdict = f"score {score:+d}"
+            text = f"Best for {to_move}: column {col + 1} ({verdict})"
+        self.analysis_label.config(text=text)
+
+    def toggle_analysis(self):
+        self.analyzing = not self.analyzing
+        self.analyze_button.config(
+            text="Analyze: On" if self.analyzing else "Analyze: Off"
+        )
+        if self.analyzing and self.game is not None:
+            self.start_analysis()
+        elif not self.analyzing:
+            self.stop_analysis()
+        self.show_analysis()
+
+    def start_analysis(self):
+        self.stop_analysis()
+        self.analysis_stop = threading.Event()
+        threading.Thread(
+            target=self.run_analysis,
+            args=(self.game, self.analysis_stop),
+            daemon=True,
+        ).start()
+
+    def stop_analysis(self):
+        if self.analysis_stop is not None:
+            self.analysis_stop.set()
+            self.analysis_stop = None
+
+    def next_position(self, game):
+        """The first position without a result, from the shown one onwards."""
+        count = len(game.moves) + 1
+        start = self.ply
+        for offset in range(count):
+            ply = (start + offset) % count
+            key = (game.cols, game.rows, game.moves[:ply])
+            if not cached_analysis(key)[0]:
+                return ply
+        return None
+
+    def run_analysis(self, game, stop_event):
+        searcher = Searcher(game.cols, game.rows)
+        while not stop_event.is_set():
+            ply = self.next_position(game)
+            if ply is None:
+                return
+            state = GameState(game.cols, game.rows)
+            for col in game.moves[:ply]:
+                state.play(col)
+            result = None
+            if not (state.has_won(state.last_player) or state.is_full()):
+                result = searcher.search(state, None, ANALYSIS_SECONDS, stop_event)
+            if stop_event.is_set():
+                return
+            store_analysis((game.cols, game.rows, game.moves[:ply]), result)
+            # Execute callback in the main thread to update the GUI
+            self.master.after(0, self.on_analysis, stop_event)
+
+    def on_analysis(self, stop_event):
+        if stop_event is self.analysis_stop:
+            self.show_analysis()
+
+
+def create_replay_board(parent_window, username, back_to_home_callback):
+    for widget in parent_window.winfo_children():
+        widget.destroy()
+    replay_board = ReplayBoard(
+        parent_window,
+        bg="blue",
+        username=username,
+        back_to_home_callback=back_to_home_callback,
+    )
+    replay_board.pack(fill="both", expand=True)
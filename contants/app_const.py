@@ -1,2 +1,3 @@
 WINDOW_SIZE = "550x550"
 DB = "db/connect4.db"
+PLAYER_COLORS = ("yellow", "red")
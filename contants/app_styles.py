@@ -1,8 +1,4 @@
-from tkinter import *
-from tkinter import messagebox, font as tkfont
-import db.database as database
-import sqlite3
-from tkinter import Tk
+from tkinter import font as tkfont
 
 
 def setup_styles():
@@ -1,64 +1,587 @@
+import atexit
 import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
 from contants.app_const import DB
+from diagnostics.instrument import timed_functions
 
+# Each thread gets one connection, opened on first use and reused for the
+# life of the process. WAL lets readers run alongside a writer, and with
+# WAL synchronous=NORMAL only syncs at checkpoints while staying consistent.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8192",  # In KiB, i.e. 8 MiB of page cache
+    "PRAGMA temp_store=MEMORY",
+)
+STATEMENT_CACHE_SIZE = 128
 
-def init_db():
-    with sqlite3.connect(DB) as db:
-        cursor = db.cursor()
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            rank INTEGER DEFAULT 0
-        )
-        """
+# Rank increments are queued and written in one transaction per flush
+RANK_FLUSH_INTERVAL = 2.0  # Seconds
+RANK_FLUSH_THRESHOLD = 256  # Users with a pending increment
+# Failed flushes in a row before the queue is written one row at a time,
+# so a row the database keeps rejecting cannot hold back the others
+RANK_FLUSH_ATTEMPTS = 5
+
+GAME_BATCH_SIZE = 1000  # Rows fetched per query while streaming games
+GAME_PAGE_SIZE = 50
+
+LEADERBOARD_PAGE_SIZE = 20
+TOP_K = 10
+
+# SQL lives in constants so every call passes the identical string and
+# sqlite3 reuses the prepared statement from the connection's cache.
+CREATE_USERS = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    rank INTEGER DEFAULT 0
+)
+"""
+# Moves are packed two to a byte, first move in the high nibble; an odd
+# count is padded with MOVE_PADDING. result is the winner's player index,
+# RESULT_DRAW or RESULT_ABANDONED; player2 is NULL for a local opponent.
+CREATE_GAMES = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    cols INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    player1 TEXT NOT NULL,
+    player2 TEXT,
+    result INTEGER NOT NULL,
+    moves BLOB NOT NULL,
+    duration REAL NOT NULL,
+    played_at INTEGER NOT NULL
+)
+"""
+CREATE_GAMES_INDEX = "CREATE INDEX IF NOT EXISTS games_player1 ON games(player1, id)"
+# Leaderboard order is rank, then id, both descending, so pages can continue
+# from the last (rank, id) with a row-value comparison on this index
+CREATE_RANK_INDEX = "CREATE INDEX IF NOT EXISTS users_rank ON users(rank, id)"
+# Users per rank value, kept current by triggers, so leaderboard positions
+# never need a scan of users
+CREATE_RANK_COUNTS = """
+CREATE TABLE IF NOT EXISTS rank_counts (
+    rank INTEGER PRIMARY KEY,
+    users INTEGER NOT NULL
+)
+"""
+FILL_RANK_COUNTS = """
+INSERT INTO rank_counts(rank, users) SELECT rank, COUNT(*) FROM users GROUP BY rank
+"""
+CREATE_RANK_COUNT_TRIGGERS = (
+    """
+CREATE TRIGGER IF NOT EXISTS users_rank_insert AFTER INSERT ON users BEGIN
+    INSERT INTO rank_counts(rank, users) VALUES (NEW.rank, 1)
+    ON CONFLICT(rank) DO UPDATE SET users = users + 1;
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS users_rank_update AFTER UPDATE OF rank ON users
+WHEN OLD.rank IS NOT NEW.rank BEGIN
+    UPDATE rank_counts SET users = users - 1 WHERE rank = OLD.rank;
+    INSERT INTO rank_counts(rank, users) VALUES (NEW.rank, 1)
+    ON CONFLICT(rank) DO UPDATE SET users = users + 1;
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS users_rank_delete AFTER DELETE ON users BEGIN
+    UPDATE rank_counts SET users = users - 1 WHERE rank = OLD.rank;
+END
+""",
+)
+SELECT_RANK_COUNTS_TABLE = (
+    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'rank_counts'"
+)
+INSERT_USER = "INSERT INTO users(username, password) VALUES (?, ?)"
+SELECT_LOGIN = "SELECT * FROM users WHERE username=? AND password=?"
+SELECT_RANK = "SELECT rank FROM users WHERE username = ?"
+SELECT_USERS_BY_RANK = "SELECT username, rank FROM users ORDER BY rank DESC"
+UPDATE_RANK = "UPDATE users SET rank = rank + ? WHERE username = ?"
+SELECT_FIRST_PAGE = """
+SELECT id, username, rank FROM users ORDER BY rank DESC, id DESC LIMIT ?
+"""
+SELECT_NEXT_PAGE = """
+SELECT id, username, rank FROM users
+WHERE (rank, id) < (?, ?)
+ORDER BY rank DESC, id DESC LIMIT ?
+"""
+SELECT_RANK_COUNTS = "SELECT rank, users FROM rank_counts WHERE users > 0"
+INSERT_GAME = """
+INSERT INTO games(cols, rows, player1, player2, result, moves, duration, played_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SELECT_GAMES = "SELECT * FROM games WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_GAME = "SELECT * FROM games WHERE id = ?"
+# Summaries leave out the move log, which is only read when a game is opened
+SELECT_FIRST_GAMES_PAGE = """
+SELECT id, cols, rows, player2, result, played_at FROM games
+WHERE player1 = ? ORDER BY id DESC LIMIT ?
+"""
+SELECT_NEXT_GAMES_PAGE = """
+SELECT id, cols, rows, player2, result, played_at FROM games
+WHERE player1 = ? AND id < ? ORDER BY id DESC LIMIT ?
+"""
+
+RESULT_DRAW = 2
+RESULT_ABANDONED = 3
+MOVE_PADDING = 0xF
+
+Game = namedtuple(
+    "Game",
+    "id cols rows player1 player2 result moves duration played_at",
+)
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+# The schema is created on first use rather than on import
+_schema_ready = False
+_schema_lock = threading.Lock()
+# Writers hold this from taking rows off the queue (or their commit) until
+# ranks_changed has run, so the histogram is never built from a commit
+# whose change is then added again, and readers see every increment once
+_leaderboard_lock = threading.Lock()
+_histogram = None  # Built on the first position query
+_top_cache = None
+_leaderboard_generation = 0  # Bumped by every rank change
+
+
+def get_connection():
+    """Returns this thread's connection, opening it on first use.
+
+    Use ``with get_connection() as db:`` around writes; the block commits on
+    success and rolls back on an exception.
+    """
+    db = getattr(_local, "connection", None)
+    if db is None:
+        # Only the owning thread uses it, but close_connections may run
+        # on another thread at exit
+        db = sqlite3.connect(
+            DB, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False
         )
-        db.commit()
+        for pragma in PRAGMAS:
+            db.execute(pragma)
+        _local.connection = db
+        with _connections_lock:
+            _connections.append(db)
+        if not _schema_ready:
+            init_db()
+    return db
+
+
+def close_connections():
+    """Closes every thread's connection; registered to run at exit."""
+    with _connections_lock:
+        for db in _connections:
+            try:
+                db.execute("PRAGMA optimize")
+                db.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+    _local.connection = None
+
+
+atexit.register(close_connections)
+
+
+def init_db():
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with get_connection() as db:
+            db.execute(CREATE_USERS)
+            db.execute(CREATE_RANK_INDEX)
+            if db.execute(SELECT_RANK_COUNTS_TABLE).fetchone() is None:
+                # First start with this schema: count the existing users once
+                db.execute(CREATE_RANK_COUNTS)
+                db.execute(FILL_RANK_COUNTS)
+            for trigger in CREATE_RANK_COUNT_TRIGGERS:
+                db.execute(trigger)
+            db.execute(CREATE_GAMES)
+            db.execute(CREATE_GAMES_INDEX)
+        _schema_ready = True
 
 
 def register_user(username, password):
-    with sqlite3.connect(DB) as db:
-        cursor = db.cursor()
-    cursor.execute(
-        "INSERT INTO users(username, password) VALUES (?, ?)", (username, password)
-    )
-    db.commit()
+    with _leaderboard_lock:
+        with get_connection() as db:
+            db.execute(INSERT_USER, (username, password))
+        ranks_changed([(username, None, 0)])
 
 
 def login_user(username, password):
-    with sqlite3.connect(DB) as db:
-        cursor = db.cursor()
-    cursor.execute(
-        "SELECT * FROM users WHERE username=? AND password=?", (username, password)
-    )
-    return cursor.fetchone()
+    return get_connection().execute(SELECT_LOGIN, (username, password)).fetchone()
 
 
 def get_user_rank(username):
-    with sqlite3.connect(DB) as db:
-        cursor = db.cursor()
-        cursor.execute("SELECT rank FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+    with _leaderboard_lock:
+        result = get_connection().execute(SELECT_RANK, (username,)).fetchone()
+        # Include increments that are still queued so a player sees their points
+        return result[0] + rank_writer.pending_for(username) if result else None
 
 
 def get_users_by_rank():
-    with sqlite3.connect(DB) as db:
-        cursor = db.cursor()
-        cursor.execute("SELECT username, rank FROM users ORDER BY rank DESC")
-        return cursor.fetchall()
+    return get_connection().execute(SELECT_USERS_BY_RANK).fetchall()
 
 
 def update_user_rank(username, rank_increment):
-    with sqlite3.connect(DB) as db:
-        cursor = db.cursor()
-        # Update the rank by incrementing it with the given rank_increment value
-        cursor.execute(
-            "UPDATE users SET rank = rank + ? WHERE username = ?",
-            (rank_increment, username),
-        )
-        db.commit()
+    with _leaderboard_lock:
+        with get_connection() as db:
+            # Update the rank by incrementing it with the given rank_increment value
+            db.execute(UPDATE_RANK, (rank_increment, username))
+            result = db.execute(SELECT_RANK, (username,)).fetchone()
+        if result:
+            ranks_changed([(username, result[0] - rank_increment, result[0])])
+
+
+class RankWriter:
+    """Write-behind queue for rank increments and finished games.
+
+    Increments are summed per user in memory and written by a background
+    thread every ``interval`` seconds, or as soon as ``threshold`` users and
+    games are pending, with one ``executemany`` each in a single
+    transaction. ``close`` flushes what is left with synchronous=FULL so it
+    survives a crash.
+
+    A failed flush is requeued and retried. After ``RANK_FLUSH_ATTEMPTS``
+    failures in a row every queued row gets its own transaction, and rows
+    that still fail are reported on stderr and dropped.
+    """
+
+    def __init__(self, interval=RANK_FLUSH_INTERVAL, threshold=RANK_FLUSH_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.pending = {}
+        self.games = []  # INSERT_GAME parameter rows
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.stopped = False
+
+    def add(self, username, rank_increment):
+        with self.lock:
+            self.pending[username] = self.pending.get(username, 0) + rank_increment
+            self.queued()
+
+    def add_game(self, row):
+        with self.lock:
+            self.games.append(row)
+            self.queued()
+
+    def queued(self):
+        """Starts the thread on first use; called with the lock held."""
+        if self.thread is None and not self.stopped:
+            self.thread = threading.Thread(
+                target=self.run, name="rank-writer", daemon=True
+            )
+            self.thread.start()
+        if len(self.pending) + len(self.games) >= self.threshold:
+            self.wake.set()
+
+    def pending_for(self, username):
+        with self.lock:
+            return self.pending.get(username, 0)
+
+    def run(self):
+        failures = 0
+        while not self.stopped:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.flush()
+                failures = 0
+            except sqlite3.Error:
+                failures += 1  # Requeued by flush, retried on the next tick
+                if failures >= RANK_FLUSH_ATTEMPTS:
+                    self.flush_singly()
+                    failures = 0
+
+    def take(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            games, self.games = self.games, []
+        return batch, games
+
+    def flush(self, durable=False):
+        with _leaderboard_lock:
+            batch, games = self.take()
+            if not batch and not games:
+                return
+            try:
+                self.write(batch, games, durable)
+            except sqlite3.Error:
+                with self.lock:
+                    for user, increment in batch.items():
+                        self.pending[user] = self.pending.get(user, 0) + increment
+                    self.games[:0] = games
+                raise
+
+    def flush_singly(self, durable=False):
+        """Writes every queued row in its own transaction, dropping failures."""
+        with _leaderboard_lock:
+            batch, games = self.take()
+            for user, increment in batch.items():
+                try:
+                    self.write({user: increment}, [], durable)
+                except sqlite3.Error as error:
+                    sys.stderr.write(
+                        f"Dropped rank update {increment:+d} for {user!r}: {error}\n"
+                    )
+            for game in games:
+                try:
+                    self.write({}, [game], durable)
+                except sqlite3.Error as error:
+                    sys.stderr.write(f"Dropped game record {game!r}: {error}\n")
+
+    def write(self, batch, games, durable=False):
+        """Commits one transaction; called with ``_leaderboard_lock`` held.
+
+        Rows leave the queue under the same lock, so readers holding it
+        see every increment either queued or committed, never neither.
+        """
+        db = get_connection()
+        if durable:
+            db.execute("PRAGMA synchronous=FULL")
+        rows = [(increment, user) for user, increment in batch.items()]
+        with db:
+            db.executemany(INSERT_GAME, games)
+            db.executemany(UPDATE_RANK, rows)
+            changes = []
+            for user, increment in batch.items():
+                result = db.execute(SELECT_RANK, (user,)).fetchone()
+                if result:
+                    changes.append((user, result[0] - increment, result[0]))
+        ranks_changed(changes)
+
+    def close(self):
+        """Stops the background thread and durably writes what is queued."""
+        self.stopped = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        try:
+            self.flush(durable=True)
+        except sqlite3.Error:
+            self.flush_singly(durable=True)
+
+
+rank_writer = RankWriter()
+# Registered after close_connections, so it runs first at exit
+atexit.register(rank_writer.close)
+
+
+def queue_rank_update(username, rank_increment):
+    """Adds to a user's rank without waiting for the database."""
+    rank_writer.add(username, rank_increment)
+
+
+def pack_moves(moves):
+    """Packs a sequence of columns (0-9) into half a byte per move."""
+    packed = bytearray()
+    for index in range(0, len(moves) - 1, 2):
+        packed.append(moves[index] << 4 | moves[index + 1])
+    if len(moves) & 1:
+        packed.append(moves[-1] << 4 | MOVE_PADDING)
+    return bytes(packed)
+
+
+# Every packed byte maps to its one or two unpacked move bytes
+_UNPACKED = [
+    bytes([byte >> 4] if byte & 0xF == MOVE_PADDING else [byte >> 4, byte & 0xF])
+    for byte in range(256)
+]
+
+
+def unpack_moves(packed):
+    """Returns the columns as bytes, one per move."""
+    return b"".join([_UNPACKED[byte] for byte in packed])
+
+
+def game_row(cols, rows, player1, player2, result, moves, duration, played_at=None):
+    if played_at is None:
+        played_at = int(time.time())
+    return (
+        cols,
+        rows,
+        player1,
+        player2,
+        result,
+        pack_moves(moves),
+        duration,
+        played_at,
+    )
+
+
+def record_game(cols, rows, player1, player2, result, moves, duration):
+    """Queues a finished game; written with the next rank flush."""
+    row = game_row(cols, rows, player1, player2, result, moves, duration)
+    rank_writer.add_game(row)
+
+
+def insert_games(games):
+    """Bulk-inserts ``game_row`` tuples in one transaction, e.g. for imports.
+
+    ``games`` may be any iterable, including a generator.
+    """
+    with get_connection() as db:
+        db.executemany(INSERT_GAME, games)
+
+
+def _to_game(row):
+    return Game(*row[:6], unpack_moves(row[6]), *row[7:])
+
+
+def get_game(game_id):
+    row = get_connection().execute(SELECT_GAME, (game_id,)).fetchone()
+    return _to_game(row) if row else None
+
+
+def get_games_page(username, before_id=None, limit=GAME_PAGE_SIZE):
+    """Returns ``(id, cols, rows, player2, result, played_at)`` rows, newest first.
+
+    Pass the id of the last row of a page to get the next one.
+    """
+    db = get_connection()
+    if before_id is None:
+        return db.execute(SELECT_FIRST_GAMES_PAGE, (username, limit)).fetchall()
+    return db.execute(SELECT_NEXT_GAMES_PAGE, (username, before_id, limit)).fetchall()
+
+
+def iter_games(after_id=0, batch_size=GAME_BATCH_SIZE):
+    """Yields every stored Game with an id above ``after_id``, oldest first.
+
+    Games are read in batches of ``batch_size`` by id range, so memory stays
+    flat however many there are and no read transaction is held between
+    batches; the writer is never blocked by a long scan.
+    """
+    db = get_connection()
+    while True:
+        rows = db.execute(SELECT_GAMES, (after_id, batch_size)).fetchall()
+        for row in rows:
+            yield _to_game(row)
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1][0]
+
+
+class RankHistogram:
+    """Fenwick tree counting users per rank value.
+
+    Answers "how many users have a higher rank" in O(log max rank) without
+    touching the database. It doubles in size when a rank outgrows it.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.tree = array("q", bytes(8 * (size + 1)))  # 1-based
+
+    def prefix(self, index):
+        """Number of users whose rank is below ``index``."""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def add(self, rank, count=1):
+        rank = max(rank, 0)
+        while rank >= self.size:
+            # The new top node covers the whole old tree, the rest start empty
+            total = self.prefix(self.size)
+            self.tree.frombytes(bytes(8 * self.size))
+            self.size *= 2
+            self.tree[self.size] = total
+        index = rank + 1
+        while index <= self.size:
+            self.tree[index] += count
+            index += index & -index
+
+    def count_above(self, rank):
+        rank = max(rank, 0)
+        if rank >= self.size:
+            return 0
+        return self.prefix(self.size) - self.prefix(rank + 1)
+
+
+def ranks_changed(changes):
+    """Keeps the histogram and top-K cache in line with ``(user, old, new)``.
+
+    ``old`` is None for a new user. Call it with ``_leaderboard_lock`` held
+    since before the commit that made the changes.
+    """
+    global _top_cache, _leaderboard_generation
+    _leaderboard_generation += 1
+    if _histogram is not None:
+        for _, old, new in changes:
+            if old is not None:
+                _histogram.add(old, -1)
+            _histogram.add(new)
+    if _top_cache is not None:
+        names = {username for _, username, _ in _top_cache}
+        lowest = _top_cache[-1][2] if len(_top_cache) == TOP_K else None
+        for username, _, new in changes:
+            if username in names or lowest is None or new >= lowest:
+                _top_cache = None
+                break
+
+
+def get_leaderboard_page(after_rank=None, after_id=None, limit=LEADERBOARD_PAGE_SIZE):
+    """Returns up to ``limit`` ``(id, username, rank)`` rows, best first.
+
+    Pass the rank and id of the last row of a page to get the next one;
+    every page is an index range scan, however deep it is.
+    """
+    db = get_connection()
+    if after_rank is None:
+        return db.execute(SELECT_FIRST_PAGE, (limit,)).fetchall()
+    return db.execute(SELECT_NEXT_PAGE, (after_rank, after_id, limit)).fetchall()
+
+
+def get_top_players():
+    """The TOP_K leaders, cached until a rank change could affect them."""
+    global _top_cache
+    with _leaderboard_lock:
+        if _top_cache is not None:
+            return _top_cache
+        generation = _leaderboard_generation
+    top = get_leaderboard_page(limit=TOP_K)
+    with _leaderboard_lock:
+        # A rank change during the query may have made these rows stale
+        if generation == _leaderboard_generation:
+            _top_cache = top
+    return top
+
+
+def get_user_position(username):
+    """1-based leaderboard position, ties sharing the best position.
+
+    The user's own queued increments count, as in ``get_user_rank``; other
+    users are placed by their committed rank. Returns None for unknown users.
+    """
+    global _histogram
+    with _leaderboard_lock:
+        result = get_connection().execute(SELECT_RANK, (username,)).fetchone()
+        if result is None:
+            return None
+        if _histogram is None:
+            histogram = RankHistogram()
+            for rank, count in get_connection().execute(SELECT_RANK_COUNTS):
+                histogram.add(rank, count)
+            _histogram = histogram
+        committed = result[0]
+        rank = committed + rank_writer.pending_for(username)
+        above = _histogram.count_above(rank)
+        if committed > rank:
+            above -= 1  # The histogram still has them at their higher rank
+        return above + 1
+
 
-init_db()
\ No newline at end of file
+# With CONNECT4_PROFILE set, every public function above is timed
+timed_functions(globals(), "db.")
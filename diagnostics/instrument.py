@@ -0,0 +1,239 @@
+"""Opt-in timing of hot paths and an on-demand profiler.
+
+Nothing here costs anything unless ``CONNECT4_PROFILE`` is set when the
+app starts: ``timed`` and ``timed_functions`` then return the functions
+they are given unchanged. When it is set, every call of an instrumented
+function is timed into a Histogram, and a table of call counts and
+p50/p95/p99/max latencies is written at exit, to stderr or to the file
+named by ``CONNECT4_PROFILE`` (any value but ``1``).
+
+Pressing F9 starts and stops a capture in the selected mode
+(``CONNECT4_PROFILE_MODE``):
+
+- ``cprofile`` (the default) profiles the Tk thread and saves a
+  ``.prof`` file for ``pstats`` or snakeviz;
+- ``sample`` snapshots every thread's stack every few milliseconds,
+  including bot searches and network threads, and saves collapsed stacks
+  for flamegraph.pl or speedscope.
+"""
+
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+
+PROFILE_ENV = "CONNECT4_PROFILE"
+MODE_ENV = "CONNECT4_PROFILE_MODE"
+ENABLED = bool(os.environ.get(PROFILE_ENV))
+CAPTURE_KEY = "<F9>"
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+SUB_BUCKETS = 4  # Per power of two, so bucket bounds are at most 19% apart
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+class Histogram:
+    """Log-linear latency histogram; recording is a few integer operations.
+
+    Durations in nanoseconds go into one of ``SUB_BUCKETS`` buckets per
+    power of two, and percentiles are read back as the upper bound of the
+    bucket they fall in.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (65 * SUB_BUCKETS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, elapsed):
+        bits = elapsed.bit_length()
+        if bits > 2:
+            bucket = bits * SUB_BUCKETS + ((elapsed >> (bits - 3)) & 3)
+        else:
+            bucket = elapsed
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def percentile(self, point):
+        target = self.count * point / 100
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                if bucket < SUB_BUCKETS * 3:
+                    return bucket
+                bits, sub = divmod(bucket, SUB_BUCKETS)
+                return min(((SUB_BUCKETS + sub + 1) << (bits - 3)) - 1, self.max)
+        return self.max
+
+
+def histogram(name):
+    with _histograms_lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+        return _histograms[name]
+
+
+def timed(name):
+    """Decorator timing every call under ``name``; a no-op unless enabled."""
+
+    def decorate(function):
+        if not ENABLED:
+            return function
+        record = histogram(name).record
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(clock() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def timed_functions(namespace, prefix):
+    """Times every public function defined in a module's ``globals()``."""
+    if not ENABLED:
+        return
+    module = namespace["__name__"]
+    for name, value in list(namespace.items()):
+        if (
+            not name.startswith("_")
+            and callable(value)
+            and not isinstance(value, type)
+            and getattr(value, "__module__", None) == module
+        ):
+            namespace[name] = timed(prefix + name)(value)
+
+
+def report():
+    """The histogram table, slowest total time first."""
+    rows = []
+    with _histograms_lock:
+        items = list(_histograms.items())
+    for name, data in sorted(items, key=lambda item: -item[1].total):
+        if data.count:
+            rows.append(
+                f"{name:<34} {data.count:>9} {data.total / 1e6:>11.1f}"
+                + "".join(
+                    f" {value / 1e6:>9.3f}"
+                    for value in (
+                        data.percentile(50),
+                        data.percentile(95),
+                        data.percentile(99),
+                        data.max,
+                    )
+                )
+            )
+    header = (
+        f"{'function':<34} {'calls':>9} {'total ms':>11} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    )
+    return "\n".join([header] + rows) + "\n"
+
+
+def dump():
+    target = os.environ.get(PROFILE_ENV)
+    if target and target != "1":
+        with open(target, "w") as file:
+            file.write(report())
+    else:
+        sys.stderr.write(report())
+
+
+class Sampler:
+    """Counts the stacks of every thread, sampled from a background thread."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self, path):
+        self.stop_event.set()
+        self.thread.join()
+        with open(path, "w") as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write(f"{stack} {count}\n")
+
+
+class Capture:
+    """Starts and stops a profile each time the hotkey is pressed."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.active = None
+
+    def toggle(self, event=None):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self.active is None:
+            if self.mode == "sample":
+                self.active = Sampler()
+                self.active.start()
+            else:
+                # Only imported once a capture starts, never at app start-up
+                import cProfile
+
+                self.active = cProfile.Profile()
+                self.active.enable()
+            sys.stderr.write(f"Profiling ({self.mode}), press F9 to stop\n")
+            return
+        profiler, self.active = self.active, None
+        if self.mode == "sample":
+            path = f"connect4-{stamp}.stacks"
+            profiler.stop(path)
+        else:
+            profiler.disable()
+            path = f"connect4-{stamp}.prof"
+            profiler.dump_stats(path)
+            import io
+            import pstats
+
+            summary = io.StringIO()
+            stats = pstats.Stats(profiler, stream=summary)
+            stats.sort_stats("cumulative").print_stats(20)
+            sys.stderr.write(summary.getvalue())
+        sys.stderr.write(f"Profile written to {path}\n")
+
+
+def bind_capture_key(window):
+    """Binds the capture hotkey on the main window when profiling is enabled."""
+    if ENABLED:
+        capture = Capture(os.environ.get(MODE_ENV, "cprofile"))
+        window.bind_all(CAPTURE_KEY, capture.toggle)
+
+
+if ENABLED:
+    atexit.register(dump)
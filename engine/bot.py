@@ -0,0 +1,45 @@
+"""How the bot picks a move at each difficulty level.
+
+Solved positions come first on small boards, then the opening book, then
+the level's engine. The bot game and the tournament runner both go
+through ``choose_move``, so a tournament measures the bot people play.
+"""
+
+from engine.search import Searcher, DIFFICULTY_LEVELS, DEFAULT_DIFFICULTY
+from engine.solver import solve_position
+
+# Levels from the default up play perfectly on boards small enough to solve;
+# a position missing from the solution cache gets this long to be solved
+SOLVER_MIN_DIFFICULTY = DEFAULT_DIFFICULTY
+SOLVE_SECONDS = 2.0
+
+
+def make_searcher(difficulty, cols, rows, seed=None):
+    """The searcher ``choose_move`` needs for ``difficulty``."""
+    if DIFFICULTY_LEVELS[difficulty][0] == "mcts":
+        # NumPy is only imported for the level that needs it
+        from engine.mcts import MCTSSearcher
+
+        return MCTSSearcher(cols, rows, seed=seed)
+    return Searcher(cols, rows)
+
+
+def choose_move(state, difficulty, searcher, book=None, stop_event=None):
+    """Picks the bot move from solved positions, the opening book or a search."""
+    if difficulty >= SOLVER_MIN_DIFFICULTY:
+        solved = solve_position(state, SOLVE_SECONDS, stop_event)
+        if solved is not None and solved[1] is not None:
+            return solved[1]
+    if book is not None:
+        col = book.lookup(state)
+        if col is not None:
+            return col
+
+    engine, depth, time_budget = DIFFICULTY_LEVELS[difficulty]
+    if engine == "parallel":
+        from engine.parallel import parallel_search
+
+        col, _ = parallel_search(state, depth, time_budget, stop_event=stop_event)
+    else:
+        col, _ = searcher.search(state, depth, time_budget, stop_event)
+    return col
@@ -0,0 +1,156 @@
+"""Headless Connect Four game state backed by two integer bitboards.
+
+Every column takes ``rows + 1`` consecutive bits, bottom cell first. The
+extra bit on top of each column is never set, which keeps the
+shift-and-mask line test from wrapping from one column into the next.
+Rows handed to and returned from the public API use the screen convention
+of the Tk boards (row 0 is the top row).
+"""
+
+MIN_SIZE = 4
+MAX_SIZE = 10
+
+
+def has_four(bitboard, directions):
+    """Returns True if the bitboard contains four aligned stones."""
+    for shift in directions:
+        pairs = bitboard & (bitboard >> shift)
+        if pairs & (pairs >> (shift << 1)):
+            return True
+    return False
+
+
+class GameState:
+    __slots__ = (
+        "cols",
+        "rows",
+        "stride",
+        "height",
+        "top",
+        "boards",
+        "moves",
+        "directions",
+        "bottom_mask",
+        "board_mask",
+    )
+
+    def __init__(self, cols=7, rows=6):
+        if not (MIN_SIZE <= cols <= MAX_SIZE and MIN_SIZE <= rows <= MAX_SIZE):
+            raise ValueError(
+                f"Board size must be between {MIN_SIZE} and {MAX_SIZE}, "
+                f"got {cols}x{rows}"
+            )
+        self.cols = cols
+        self.rows = rows
+        self.stride = rows + 1
+        # Bit index of the next free cell in each column
+        self.height = [col * self.stride for col in range(cols)]
+        # Bit index of the sentinel cell above each column
+        self.top = [col * self.stride + rows for col in range(cols)]
+        self.boards = [0, 0]
+        self.moves = []
+        self.directions = (1, self.stride, self.stride + 1, self.stride - 1)
+        self.bottom_mask = sum(1 << (col * self.stride) for col in range(cols))
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+
+    @property
+    def current_player(self):
+        """Index (0 or 1) of the player whose turn it is."""
+        return len(self.moves) & 1
+
+    @property
+    def last_player(self):
+        """Index of the player who made the last move."""
+        return (len(self.moves) & 1) ^ 1
+
+    def can_play(self, col):
+        return 0 <= col < self.cols and self.height[col] != self.top[col]
+
+    def legal_moves(self):
+        return [col for col in range(self.cols) if self.height[col] != self.top[col]]
+
+    def play(self, col):
+        """Drops a stone for the current player and returns its screen row.
+
+        The caller is responsible for checking ``can_play`` first.
+        """
+        bit = self.height[col]
+        self.boards[len(self.moves) & 1] |= 1 << bit
+        self.height[col] = bit + 1
+        self.moves.append(col)
+        return self.rows - 1 - (bit - col * self.stride)
+
+    def undo(self):
+        """Takes back the last move and returns its column."""
+        col = self.moves.pop()
+        bit = self.height[col] - 1
+        self.height[col] = bit
+        self.boards[len(self.moves) & 1] ^= 1 << bit
+        return col
+
+    def has_won(self, player):
+        return has_four(self.boards[player], self.directions)
+
+    def is_winning_move(self, col, player=None):
+        """Returns True if dropping in ``col`` would complete four for ``player``.
+
+        ``player`` defaults to the player whose turn it is.
+        """
+        if player is None:
+            player = len(self.moves) & 1
+        board = self.boards[player] | (1 << self.height[col])
+        return has_four(board, self.directions)
+
+    def is_full(self):
+        return len(self.moves) == self.cols * self.rows
+
+    def cell(self, row, col):
+        """Returns the player index occupying a screen cell, or None."""
+        bit = 1 << (col * self.stride + self.rows - 1 - row)
+        if self.boards[0] & bit:
+            return 0
+        if self.boards[1] & bit:
+            return 1
+        return None
+
+    def copy(self):
+        clone = GameState.__new__(GameState)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.height = list(self.height)
+        clone.boards = list(self.boards)
+        clone.moves = list(self.moves)
+        return clone
+
+
+class BoardGeometry:
+    """Masks, center-first move order and threat detection for searches.
+
+    Searches work on two integers laid out like ``GameState.boards``:
+    ``position`` holds the stones of the player to move and ``mask`` every
+    stone on the board.
+    """
+
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.cells = cols * rows
+        self.stride = stride = rows + 1
+        self.bottom_mask = sum(1 << (col * stride) for col in range(cols))
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+        self.column_masks = [((1 << rows) - 1) << (col * stride) for col in range(cols)]
+        # Center-first move ordering, e.g. 3, 2, 4, 1, 5, 0, 6 for seven columns
+        center = (cols - 1) / 2
+        self.order = sorted(range(cols), key=lambda col: (abs(col - center), col))
+
+    def winning_cells(self, position, mask):
+        """Returns the empty cells that would complete four for ``position``."""
+        cells = (position << 1) & (position << 2) & (position << 3)
+        for shift in (self.stride, self.stride - 1, self.stride + 1):
+            pair = (position << shift) & (position << (2 * shift))
+            cells |= pair & (position << (3 * shift))
+            cells |= pair & (position >> shift)
+            pair = (position >> shift) & (position >> (2 * shift))
+            cells |= pair & (position << shift)
+            cells |= pair & (position >> (3 * shift))
+        return cells & (self.board_mask ^ mask)
@@ -0,0 +1,236 @@
+"""Monte Carlo Tree Search (UCT) bot with batched NumPy playouts.
+
+Each iteration selects a batch of leaves (with virtual loss, so the batch
+spreads over the tree) and then plays all of their random games to the end
+at once: the boards live in one ``(batch, rows + 6, cols + 6)`` int8 array
+padded by three empty cells on every side, and each playout step drops one
+stone in every unfinished game with a handful of array operations.
+"""
+
+import math
+import time
+import numpy as np
+
+DEFAULT_PLAYOUTS = 20000
+DEFAULT_BATCH_SIZE = 256
+EXPLORATION = 1.4
+PADDING = 3
+
+# Cell offsets from a new stone along each of the four line directions
+_STEPS = np.arange(-PADDING, PADDING + 1)
+LINE_OFFSETS = [
+    (_STEPS * dr, _STEPS * dc) for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1))
+]
+
+
+def wins_at(grids, boards, rows, cols, players):
+    """Returns which of ``boards`` have four in a row through (row, col)."""
+    rows = rows[:, None] + PADDING
+    cols = cols[:, None] + PADDING
+    boards = boards[:, None]
+    players = players[:, None]
+    won = np.zeros(len(players), dtype=bool)
+    for row_offsets, col_offsets in LINE_OFFSETS:
+        line = grids[boards, rows + row_offsets, cols + col_offsets] == players
+        won |= (line[:, :4] & line[:, 1:5] & line[:, 2:6] & line[:, 3:]).any(axis=1)
+    return won
+
+
+def batch_playouts(grids, heights, to_move, rng):
+    """Plays uniformly random moves on every board until each game ends.
+
+    ``grids`` hold 0 for empty and 1 or 2 for the players, with row 0 at the
+    bottom; ``heights`` is the stone count of each column. Both, like
+    ``to_move``, are updated in place. Returns the winner per board, with 0
+    for a draw.
+    """
+    rows = grids.shape[1] - 2 * PADDING
+    winners = np.zeros(len(grids), dtype=np.int8)
+    active = np.arange(len(grids))
+    while active.size:
+        legal = heights[active] < rows
+        open_boards = legal.any(axis=1)
+        active, legal = active[open_boards], legal[open_boards]
+        if not active.size:
+            break
+        cols = np.where(legal, rng.random(legal.shape), -1.0).argmax(axis=1)
+        rows_played = heights[active, cols]
+        players = to_move[active]
+        grids[active, rows_played + PADDING, cols + PADDING] = players
+        heights[active, cols] += 1
+        won = wins_at(grids, active, rows_played, cols, players)
+        winners[active[won]] = players[won]
+        to_move[active] = 3 - players
+        active = active[~won]
+    return winners
+
+
+class Node:
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins")
+
+    def __init__(self, move, parent, untried):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        # Results from the view of the player who made ``move``
+        self.wins = 0.0
+
+    def select_child(self):
+        log_visits = math.log(self.visits)
+        return max(
+            self.children,
+            key=lambda child: child.wins / child.visits
+            + EXPLORATION * math.sqrt(log_visits / child.visits),
+        )
+
+
+class MCTSSearcher:
+    """Drop-in alternative to ``Searcher`` with the same ``search`` method."""
+
+    def __init__(
+        self,
+        cols,
+        rows,
+        playouts=DEFAULT_PLAYOUTS,
+        batch_size=DEFAULT_BATCH_SIZE,
+        seed=None,
+    ):
+        self.cols = cols
+        self.rows = rows
+        self.playout_budget = playouts
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.playouts = 0
+        self.playouts_per_second = 0.0
+        self.nodes = 0
+
+    def search(self, state, depth=None, time_budget=None, stop_event=None):
+        """Returns ``(column, win rate)`` for the player to move in ``state``.
+
+        ``depth`` is accepted for interface compatibility and ignored; the
+        search stops at the playout budget, the time budget or the stop
+        event, whichever comes first.
+        """
+        legal = state.legal_moves()
+        if not legal:
+            return None, 0.0
+        for col in legal:
+            if state.is_winning_move(col):
+                return col, 1.0
+        blocks = [
+            col for col in legal if state.is_winning_move(col, state.current_player ^ 1)
+        ]
+
+        start = time.perf_counter()
+        deadline = start + time_budget if time_budget is not None else None
+        root = Node(None, None, blocks or legal)
+        work = state.copy()
+        root_moves = len(work.moves)
+        root_value = state.current_player + 1
+        root_grid, root_heights = self.to_arrays(state)
+        self.playouts = 0
+        self.nodes = 1
+
+        while self.playouts < self.playout_budget:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if stop_event is not None and stop_event.is_set():
+                break
+            batch = min(self.batch_size, self.playout_budget - self.playouts)
+            leaves = []
+            paths = []
+            for _ in range(batch):
+                node, winner = self.select_leaf(root, work)
+                if winner is None:
+                    leaves.append(node)
+                    paths.append(work.moves[root_moves:])
+                else:
+                    depth = len(work.moves) - root_moves
+                    self.backpropagate(node, winner, root_value, depth)
+                    self.playouts += 1
+                while len(work.moves) > root_moves:
+                    work.undo()
+            if leaves:
+                self.rollout(leaves, paths, root_grid, root_heights, root_value)
+
+        elapsed = time.perf_counter() - start
+        self.playouts_per_second = self.playouts / elapsed if elapsed > 0 else 0.0
+        if not root.children:
+            return root.untried[0], 0.5
+        best = max(root.children, key=lambda child: child.visits)
+        return best.move, best.wins / best.visits
+
+    def select_leaf(self, root, work):
+        """Walks down with UCT and expands one node.
+
+        Visits are counted on the way down (virtual loss) so the rest of the
+        batch prefers other paths. Returns the leaf and, for finished games,
+        the winning grid value (0 for a draw) or None if it needs a playout.
+        """
+        node = root
+        node.visits += 1
+        while not node.untried and node.children:
+            node = node.select_child()
+            work.play(node.move)
+            node.visits += 1
+        if node.untried:
+            move = node.untried.pop(int(self.rng.integers(len(node.untried))))
+            work.play(move)
+            over = work.has_won(work.last_player) or work.is_full()
+            child = Node(move, node, [] if over else work.legal_moves())
+            node.children.append(child)
+            node = child
+            node.visits += 1
+            self.nodes += 1
+        if node is root:
+            return node, 0
+        if work.has_won(work.last_player):
+            return node, work.last_player + 1
+        if work.is_full():
+            return node, 0
+        return node, None
+
+    def rollout(self, leaves, paths, root_grid, root_heights, root_value):
+        count = len(leaves)
+        grids = np.repeat(root_grid[None], count, axis=0)
+        heights = np.repeat(root_heights[None], count, axis=0)
+        to_move = np.empty(count, dtype=np.int8)
+        for index, path in enumerate(paths):
+            player = root_value
+            for col in path:
+                grids[index, heights[index, col] + PADDING, col + PADDING] = player
+                heights[index, col] += 1
+                player = 3 - player
+            to_move[index] = player
+        winners = batch_playouts(grids, heights, to_move, self.rng)
+        for node, path, winner in zip(leaves, paths, winners):
+            self.backpropagate(node, int(winner), root_value, len(path))
+        self.playouts += count
+
+    def backpropagate(self, node, winner, root_value, depth):
+        # The player who made the leaf move alternates with depth from the root
+        mover = root_value if depth % 2 else 3 - root_value
+        while node.parent is not None:
+            if winner == mover:
+                node.wins += 1.0
+            elif winner == 0:
+                node.wins += 0.5
+            mover = 3 - mover
+            node = node.parent
+
+    def to_arrays(self, state):
+        """Returns the padded grid and column heights of a GameState."""
+        grid = np.zeros(
+            (self.rows + 2 * PADDING, self.cols + 2 * PADDING), dtype=np.int8
+        )
+        heights = np.zeros(self.cols, dtype=np.int64)
+        for col in range(self.cols):
+            for row in range(self.rows):
+                player = state.cell(self.rows - 1 - row, col)
+                if player is None:
+                    break
+                grid[row + PADDING, col + PADDING] = player + 1
+                heights[col] += 1
+        return grid, heights
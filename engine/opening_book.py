@@ -0,0 +1,183 @@
+"""Precomputed opening moves stored in sorted binary book files.
+
+A book file starts with a small header followed by fixed-size records of
+``(position key, best column)`` sorted by key. The key is the usual
+``position + mask`` encoding (unique per position and side to move) of
+the smaller of a position and its mirror image, written big-endian so
+that byte order and numeric order agree. Lookups binary search the file
+through ``mmap``, so opening a book reads nothing but the header.
+
+Books are generated offline with ``python -m engine.opening_book``.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from engine.game_state import GameState, MIN_SIZE, MAX_SIZE
+from engine.search import Searcher
+
+BOOK_DIR = os.path.join(os.path.dirname(__file__), "books")
+MAGIC = b"C4BK"
+HEADER = struct.Struct("<4sBBI")  # magic, cols, rows, record count
+NO_MOVE = 255
+
+_books = {}
+
+
+def book_path(cols, rows):
+    return os.path.join(BOOK_DIR, f"{cols}x{rows}.book")
+
+
+def key_size(cols, rows):
+    return (cols * (rows + 1) + 7) // 8
+
+
+def mirror_bits(bits, cols, stride):
+    column_mask = (1 << stride) - 1
+    mirrored = 0
+    for col in range(cols):
+        column = (bits >> (col * stride)) & column_mask
+        mirrored |= column << ((cols - 1 - col) * stride)
+    return mirrored
+
+
+def canonical_key(state):
+    """Returns ``(key, flipped)`` where flipped means the mirror was smaller."""
+    mask = state.boards[0] | state.boards[1]
+    key = state.boards[state.current_player] + mask
+    mirrored = mirror_bits(key, state.cols, state.stride)
+    if mirrored < key:
+        return mirrored, True
+    return key, False
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.cols, self.rows, self.count = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.key_size = key_size(self.cols, self.rows)
+        self.record_size = self.key_size + 1
+
+    def lookup(self, state):
+        """Returns the book column for ``state``, or None if it is not in the book."""
+        if state.cols != self.cols or state.rows != self.rows:
+            return None
+        key, flipped = canonical_key(state)
+        target = key.to_bytes(self.key_size, "big")
+        data = self.data
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * self.record_size
+            found = data[offset : offset + self.key_size]
+            if found < target:
+                low = middle + 1
+            elif found > target:
+                high = middle
+            else:
+                col = data[offset + self.key_size]
+                if col == NO_MOVE:
+                    return None
+                return self.cols - 1 - col if flipped else col
+        return None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def load_book(cols, rows):
+    """Returns the shared book for a board size, or None if there is none."""
+    if (cols, rows) not in _books:
+        path = book_path(cols, rows)
+        _books[(cols, rows)] = OpeningBook(path) if os.path.exists(path) else None
+    return _books[(cols, rows)]
+
+
+def opening_positions(cols, rows, plies):
+    """Yields move lists of every distinct position up to ``plies`` deep.
+
+    Mirror images and transpositions are yielded once, and positions that
+    are already won are skipped.
+    """
+    seen = set()
+    frontier = [[]]
+    for _ in range(plies + 1):
+        next_frontier = []
+        for moves in frontier:
+            state = GameState(cols, rows)
+            for move in moves:
+                state.play(move)
+            key, _ = canonical_key(state)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield moves
+            for col in state.legal_moves():
+                if not state.is_winning_move(col):
+                    next_frontier.append(moves + [col])
+        frontier = next_frontier
+
+
+def _solve_opening(cols, rows, moves, depth):
+    """Pool task: returns ``(canonical key, canonical best column)``."""
+    state = GameState(cols, rows)
+    for move in moves:
+        state.play(move)
+    col, _ = Searcher(cols, rows).search(state, depth)
+    key, flipped = canonical_key(state)
+    if col is None:
+        return key, NO_MOVE
+    return key, cols - 1 - col if flipped else col
+
+
+def generate_book(cols, rows, plies, depth, workers=1):
+    """Searches every opening position and writes the book file."""
+    positions = list(opening_positions(cols, rows, plies))
+    tasks = ([cols] * len(positions), [rows] * len(positions), positions)
+    if workers > 1:
+        from engine.parallel import get_pool
+
+        results = get_pool(workers).map(
+            _solve_opening, *tasks, [depth] * len(positions), chunksize=4
+        )
+    else:
+        results = map(_solve_opening, *tasks, [depth] * len(positions))
+    entries = sorted(results)
+
+    size = key_size(cols, rows)
+    os.makedirs(BOOK_DIR, exist_ok=True)
+    with open(book_path(cols, rows), "wb") as book:
+        book.write(HEADER.pack(MAGIC, cols, rows, len(entries)))
+        for key, col in entries:
+            book.write(key.to_bytes(size, "big"))
+            book.write(bytes((col,)))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate bot opening books")
+    parser.add_argument(
+        "--cols", type=int, nargs="+", default=list(range(MIN_SIZE, MAX_SIZE + 1))
+    )
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    for cols in args.cols:
+        start = time.perf_counter()
+        count = generate_book(cols, args.rows, args.plies, args.depth, args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"{cols}x{args.rows}: {count} positions in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
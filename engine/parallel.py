@@ -0,0 +1,235 @@
+"""Root-split parallel search on a shared process pool.
+
+Every legal root move is searched to ``depth - 1`` in its own task and the
+best reply score decides the move. Under a time budget the root deepens
+iteratively, so every move is scored to the same depth even when there
+are fewer workers than legal moves. The pool is created the first time it
+is needed and then reused for every later turn and game; each worker
+process keeps its own Searcher per board size, so transposition tables
+stay warm between tasks too.
+
+Run ``python -m engine.parallel`` to print the speedup for several worker
+counts.
+"""
+
+import argparse
+import atexit
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from engine.game_state import GameState
+from engine.search import Searcher, WIN_SCORE
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+POLL_INTERVAL = 0.05
+
+_pool = None
+_pool_workers = 0
+_worker_searchers = {}
+
+
+def get_pool(workers=DEFAULT_WORKERS):
+    """Returns the shared pool, starting it (or resizing it) on demand."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        # Spawned workers never inherit the Tk interpreter or its threads
+        _pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+atexit.register(shutdown_pool)
+
+
+def _search_child(cols, rows, moves, col, depth, deadline):
+    """Worker task: scores root move ``col`` from the root player's view.
+
+    ``deadline`` is a ``time.time()`` value shared by every task of one
+    iteration. The score is None when the search to ``depth`` could not
+    finish before it.
+    """
+    time_budget = None
+    if deadline is not None:
+        time_budget = deadline - time.time()
+        if time_budget <= 0:
+            return col, None, 0
+    searcher = _worker_searchers.get((cols, rows))
+    if searcher is None:
+        searcher = _worker_searchers[(cols, rows)] = Searcher(cols, rows)
+    state = GameState(cols, rows)
+    for move in moves:
+        state.play(move)
+    state.play(col)
+    if state.is_full():
+        return col, 0, 0
+    target = searcher.cells - len(state.moves)
+    if depth is not None:
+        target = min(depth, target)
+    _, score = searcher.search(state, depth, time_budget)
+    if searcher.depth_reached < target and abs(score) < WIN_SCORE - searcher.cells:
+        return col, None, searcher.nodes
+    return col, -score, searcher.nodes
+
+
+def _score_moves(pool, state, legal, depth, deadline, stop_event):
+    """Searches every move in ``legal`` to ``depth`` on the pool.
+
+    Returns a ``{column: score}`` dict, with None for moves that ran out of
+    time, or None when cancelled through ``stop_event``.
+    """
+    pending = {
+        pool.submit(
+            _search_child,
+            state.cols,
+            state.rows,
+            list(state.moves),
+            col,
+            depth,
+            deadline,
+        )
+        for col in legal
+    }
+    scores = {}
+    while pending:
+        done, pending = wait(
+            pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED
+        )
+        if stop_event is not None and stop_event.is_set():
+            for future in pending:
+                future.cancel()
+            return None
+        for future in done:
+            col, score, _ = future.result()
+            scores[col] = score
+            if score is None and deadline is not None:
+                # The deadline has passed, so the rest cannot finish either
+                for future in pending:
+                    future.cancel()
+                return scores
+    return scores
+
+
+def parallel_search(
+    state, depth=None, time_budget=None, workers=DEFAULT_WORKERS, stop_event=None
+):
+    """Returns ``(column, score)`` like ``Searcher.search`` using the pool.
+
+    With a time budget the root deepens one ply at a time and every legal
+    move is searched to the same depth in each iteration, so the result
+    always comes from an iteration in which all of them got a score. The
+    first iteration is never cut short. Returns ``(None, 0)`` when
+    cancelled through ``stop_event``.
+    """
+    legal = state.legal_moves()
+    if not legal:
+        return None, 0
+    for col in legal:
+        if state.is_winning_move(col):
+            return col, WIN_SCORE - len(state.moves)
+
+    cells = state.cols * state.rows
+    max_depth = cells - len(state.moves) - 1
+    if depth is not None:
+        max_depth = min(max(depth - 1, 0), max_depth)
+    deadline = None if time_budget is None else time.time() + time_budget
+    center = (state.cols - 1) / 2
+    legal.sort(key=lambda col: abs(col - center))
+    pool = get_pool(workers)
+
+    if deadline is None:
+        # No clock to race, so search straight to the requested depth
+        child_depth = None if depth is None else max_depth
+        scores = _score_moves(pool, state, legal, child_depth, None, stop_event)
+        if scores is None:
+            return None, 0
+    else:
+        scores = None
+        child_depth = min(1, max_depth)
+        while True:
+            iteration_start = time.time()
+            found = _score_moves(
+                pool,
+                state,
+                legal,
+                child_depth,
+                deadline if scores is not None else None,
+                stop_event,
+            )
+            if found is None:
+                return None, 0
+            if len(found) < len(legal) or None in found.values():
+                break
+            scores = found
+            now = time.time()
+            if (
+                child_depth >= max_depth
+                or max(abs(score) for score in scores.values()) >= WIN_SCORE - cells
+                # Each extra ply costs a few times the previous one
+                or (now - iteration_start) * 3 > deadline - now
+            ):
+                break
+            child_depth += 1
+
+    best_col, best_score = legal[0], -WIN_SCORE - 1
+    for col in legal:
+        # Ties go to the column closer to the center, which comes first
+        if scores[col] > best_score:
+            best_col, best_score = col, scores[col]
+    return best_col, best_score
+
+
+def measure_speedup(cols=7, rows=6, depth=9, worker_counts=(1, 2, 4, 8), moves=()):
+    """Times a fixed-depth parallel search for each worker count.
+
+    Returns a list of ``(workers, seconds, speedup)`` rows where speedup is
+    relative to the first worker count.
+    """
+    state = GameState(cols, rows)
+    for move in moves:
+        state.play(move)
+    results = []
+    for workers in worker_counts:
+        pool = get_pool(workers)
+        # Warm the pool up so process start-up is not part of the timing
+        list(pool.map(abs, range(workers)))
+        start = time.perf_counter()
+        parallel_search(state, depth, workers=workers)
+        elapsed = time.perf_counter() - start
+        base = results[0][1] if results else elapsed
+        results.append((workers, elapsed, base / elapsed))
+        shutdown_pool()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel bot search speedup")
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--depth", type=int, default=9)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, DEFAULT_WORKERS]
+    )
+    args = parser.parse_args()
+
+    print(f"{args.cols}x{args.rows} board, depth {args.depth}")
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+    for workers, seconds, speedup in measure_speedup(
+        args.cols, args.rows, args.depth, args.workers
+    ):
+        print(f"{workers:>8} {seconds:>10.3f} {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Negamax alpha-beta search over the GameState bitboards.
+
+The search works on a pair of plain integers: ``position`` holds the stones
+of the player to move and ``mask`` holds every stone on the board. Playing
+a move is then ``position ^ mask, mask | move`` and nothing is allocated on
+the way down the tree.
+"""
+
+import time
+from engine.game_state import BoardGeometry
+from engine.transposition import (
+    DEFAULT_SIZE_MB,
+    DEPTH_SHIFT,
+    BOUND_SHIFT,
+    SCORE_SHIFT,
+    SCORE_OFFSET,
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND,
+    TranspositionTable,
+    ZobristKeys,
+)
+
+WIN_SCORE = 100000
+
+# Engine and search limits for each difficulty level offered in the bot
+# game: (engine, maximum depth, time budget in seconds). The engine is
+# "search" for Searcher, "parallel" for the multi-core root split and
+# "mcts" for Monte Carlo tree search. None means unlimited.
+DIFFICULTY_LEVELS = {
+    1: ("search", 2, None),
+    2: ("search", 4, None),
+    3: ("search", 8, None),
+    4: ("search", None, 1.0),
+    5: ("parallel", None, 2.0),
+    6: ("mcts", None, 1.0),
+}
+DEFAULT_DIFFICULTY = 3
+
+# The clock and stop event are polled once every 1024 nodes
+STOP_CHECK_INTERVAL = 1023
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when its deadline passes or it is cancelled."""
+
+
+class Searcher(BoardGeometry):
+    def __init__(self, cols, rows, table_size_mb=DEFAULT_SIZE_MB):
+        super().__init__(cols, rows)
+        self.center_mask = sum(
+            self.column_masks[col] for col in self.order[: 2 - cols % 2]
+        )
+        self.zobrist = ZobristKeys(cols, rows)
+        self.table = TranspositionTable(table_size_mb)
+        self.nodes = 0
+        self.depth_reached = 0
+        self.deadline = None
+        self.stop_event = None
+
+    def evaluate(self, position, mask):
+        """Static score of a quiet position from the side to move's view."""
+        opponent = position ^ mask
+        threats = (
+            self.winning_cells(position, mask).bit_count()
+            - self.winning_cells(opponent, mask).bit_count()
+        )
+        center = (position & self.center_mask).bit_count() - (
+            opponent & self.center_mask
+        ).bit_count()
+        return threats * 16 + center * 3
+
+    def search(self, state, depth=None, time_budget=None, stop_event=None):
+        """Returns ``(column, score)`` for the player to move in ``state``.
+
+        The search deepens one ply at a time up to ``depth``. A time budget
+        is a hard deadline: an iteration still running when it expires is
+        abandoned and the result of the last completed one is returned.
+        Setting ``stop_event`` (a ``threading.Event``) aborts the same way.
+        """
+        position = state.boards[state.current_player]
+        mask = state.boards[0] | state.boards[1]
+        moves = len(state.moves)
+        key, mirrored = self.zobrist.hash_state(state)
+        max_depth = self.cells - moves
+        if depth is not None:
+            max_depth = min(depth, max_depth)
+        self.nodes = 0
+        self.depth_reached = 0
+
+        start = time.perf_counter()
+        self.deadline = start + time_budget if time_budget is not None else None
+        self.stop_event = stop_event
+        legal = [col for col in self.order if state.can_play(col)]
+        best_col, best_score = (legal[0] if legal else None), 0
+        for current_depth in range(1, max_depth + 1):
+            iteration_start = time.perf_counter()
+            try:
+                best_col, best_score = self.search_root(
+                    position, mask, moves, current_depth, key, mirrored, best_col
+                )
+            except SearchAborted:
+                break
+            self.depth_reached = current_depth
+            if abs(best_score) >= WIN_SCORE - self.cells:
+                break
+            if self.deadline is not None:
+                now = time.perf_counter()
+                # Each extra ply costs a few times the previous one, so do not
+                # start an iteration that would only be thrown away
+                if (now - iteration_start) * 3 > self.deadline - now:
+                    break
+        return best_col, best_score
+
+    def check_stop(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchAborted()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchAborted()
+
+    def search_root(self, position, mask, moves, depth, key, mirrored, first_col=None):
+        possible = (mask + self.bottom_mask) & self.board_mask
+        wins = self.winning_cells(position, mask) & possible
+        order = self.order
+        if first_col is not None:
+            order = [first_col] + [col for col in order if col != first_col]
+        keys = self.zobrist.keys[moves & 1]
+        mirror_keys = self.zobrist.mirror_keys[moves & 1]
+
+        best_col, best_score = None, -WIN_SCORE - 1
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        for col in order:
+            move = possible & self.column_masks[col]
+            if not move:
+                continue
+            if wins & move:
+                return col, WIN_SCORE - moves
+            bit = move.bit_length() - 1
+            score = -self.negamax(
+                position ^ mask,
+                mask | move,
+                moves + 1,
+                depth - 1,
+                -beta,
+                -alpha,
+                key ^ keys[bit],
+                mirrored ^ mirror_keys[bit],
+            )
+            if score > best_score:
+                best_col, best_score = col, score
+                alpha = max(alpha, score)
+        return best_col, best_score
+
+    def negamax(self, position, mask, moves, depth, alpha, beta, key, mirrored):
+        self.nodes += 1
+        if not self.nodes & STOP_CHECK_INTERVAL:
+            self.check_stop()
+        possible = (mask + self.bottom_mask) & self.board_mask
+        if not possible:
+            return 0
+        if self.winning_cells(position, mask) & possible:
+            return WIN_SCORE - moves
+
+        opponent_wins = self.winning_cells(position ^ mask, mask)
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return -(WIN_SCORE - moves - 1)  # Two threats, only one block
+            possible = forced
+        # Never play directly below a cell the opponent is waiting for
+        possible &= ~(opponent_wins >> 1)
+        if not possible:
+            return -(WIN_SCORE - moves - 1)
+        if depth <= 0:
+            return self.evaluate(position, mask)
+
+        # A position and its mirror image share one table entry, stored
+        # under the smaller key with the best move in that orientation
+        flip = mirrored < key
+        table_key = mirrored if flip else key
+        order = self.order
+        data = self.table.probe(table_key)
+        if data:
+            table_move = (data & 15) - 1
+            if table_move >= 0:
+                if flip:
+                    table_move = self.cols - 1 - table_move
+                order = [table_move] + [col for col in order if col != table_move]
+            if (data >> DEPTH_SHIFT) & 127 >= depth:
+                score = (data >> SCORE_SHIFT) - SCORE_OFFSET
+                bound = (data >> BOUND_SHIFT) & 3
+                if bound == EXACT:
+                    return score
+                if bound == LOWER_BOUND:
+                    if score > alpha:
+                        alpha = score
+                elif score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+
+        original_alpha = alpha
+        keys = self.zobrist.keys[moves & 1]
+        mirror_keys = self.zobrist.mirror_keys[moves & 1]
+        best_score = -WIN_SCORE - 1
+        best_col = -1
+        for col in order:
+            move = possible & self.column_masks[col]
+            if not move:
+                continue
+            bit = move.bit_length() - 1
+            score = -self.negamax(
+                position ^ mask,
+                mask | move,
+                moves + 1,
+                depth - 1,
+                -beta,
+                -alpha,
+                key ^ keys[bit],
+                mirrored ^ mirror_keys[bit],
+            )
+            if score > best_score:
+                best_score = score
+                best_col = col
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        if flip:
+            best_col = self.cols - 1 - best_col
+        self.table.store(table_key, best_score, depth, bound, best_col)
+        return best_score
@@ -0,0 +1,469 @@
+"""Exact solver for small boards with a persistent, shared result cache.
+
+``Solver`` finds the game-theoretic value of a position with a null-window
+negamax in the style of Pascal Pons' solver: only moves that do not lose
+at once are tried, best threats first, and the transposition table keeps
+upper bounds. Scores count how early a game is won: a win with the
+side to move's last stone is 1, a win one move sooner 2 and so on; a loss
+is the negative of the opponent's win and a draw is 0.
+
+``SolutionCache`` stores ``(position, score, best column)`` for solved
+positions in an append-only log in a per-user cache directory
+(``CONNECT4_CACHE_DIR``, by default ``~/.cache/connect4``). A new log
+starts as a copy of the one shipped next to the opening books, which is
+never written to while playing. A hash index
+over the log lives in a separate file mapped into memory, so a lookup is
+a few probes however many positions are stored. Several processes can
+share both files: appends are serialised with a file lock, and a reader
+that misses catches its index up with whatever the log gained since.
+The index can always be rebuilt from the log.
+
+Run ``python -m engine.solver --cache-dir engine/books`` to pre-solve the
+openings of small boards into the shipped logs.
+"""
+
+import argparse
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from engine.game_state import BoardGeometry, GameState
+from engine.opening_book import BOOK_DIR, canonical_key
+from engine.search import STOP_CHECK_INTERVAL
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Boards small enough to solve while the bot is thinking
+SOLVED_SIZES = ((4, 6), (5, 6))
+TABLE_LIMIT = 4_000_000  # Entries before the transposition table is cleared
+CACHE_DIR = os.environ.get("CONNECT4_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "connect4",
+)
+
+LOG_MAGIC = b"C4SV"
+LOG_HEADER = struct.Struct("<4sBB")  # magic, cols, rows
+RECORD = struct.Struct("<QbB")  # canonical key, score, canonical best column
+INDEX_MAGIC = b"C4SI"
+INDEX_HEADER = struct.Struct("<4sII")  # magic, slot count, records indexed
+SLOT = struct.Struct("<QbB")  # key + 1 (0 marks an empty slot), score, column
+MIN_SLOTS = 1 << 12
+NO_MOVE = 255
+
+_caches = {}
+_solvers = {}
+_solvers_lock = threading.Lock()
+
+
+class SolveAborted(Exception):
+    """Raised inside the solver when its stop event is set."""
+
+
+class Solver(BoardGeometry):
+    def __init__(self, cols, rows):
+        super().__init__(cols, rows)
+        self.table = {}
+        self.lock = threading.Lock()
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = None
+
+    def solve(self, state, time_budget=None, stop_event=None):
+        """Returns ``(score, best column)`` for the player to move in ``state``.
+
+        Raises SolveAborted if the time budget runs out or ``stop_event`` is
+        set before it finishes; the table keeps what was learned so far.
+        """
+        position = state.boards[state.current_player]
+        mask = state.boards[0] | state.boards[1]
+        moves = len(state.moves)
+        self.deadline = None
+        if time_budget is not None:
+            self.deadline = time.perf_counter() + time_budget
+        self.stop_event = stop_event
+        possible = (mask + self.bottom_mask) & self.board_mask
+        if not possible:
+            return 0, None
+        wins = self.winning_cells(position, mask) & possible
+        best_col, best_score = None, None
+        for col in self.order:
+            move = possible & self.column_masks[col]
+            if not move:
+                continue
+            if wins & move:
+                return (self.cells + 1 - moves) // 2, col
+            score = -self.value(position ^ mask, mask | move, moves + 1)
+            if best_score is None or score > best_score:
+                best_col, best_score = col, score
+        return best_score, best_col
+
+    def check_stop(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SolveAborted()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SolveAborted()
+
+    def value(self, position, mask, moves):
+        """Exact score for the side to move, by null-window bisection."""
+        if moves == self.cells:
+            return 0
+        possible = (mask + self.bottom_mask) & self.board_mask
+        if self.winning_cells(position, mask) & possible:
+            return (self.cells + 1 - moves) // 2
+        low = -((self.cells - moves) // 2)
+        high = (self.cells + 1 - moves) // 2
+        while low < high:
+            middle = low + (high - low) // 2
+            # Probing near zero first settles most positions in a step or two
+            if middle <= 0 and low // 2 < middle:
+                middle = low // 2
+            elif middle >= 0 and high // 2 > middle:
+                middle = high // 2
+            result = self.negamax(position, mask, moves, middle, middle + 1)
+            if result <= middle:
+                high = result
+            else:
+                low = result
+        return low
+
+    def negamax(self, position, mask, moves, alpha, beta):
+        """Alpha-beta over positions where the side to move cannot win at once."""
+        self.nodes += 1
+        if not self.nodes & STOP_CHECK_INTERVAL:
+            self.check_stop()
+        possible = (mask + self.bottom_mask) & self.board_mask
+        opponent_wins = self.winning_cells(position ^ mask, mask)
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return -((self.cells - moves) // 2)  # Two threats, only one block
+            possible = forced
+        possible &= ~(opponent_wins >> 1)
+        if not possible:
+            return -((self.cells - moves) // 2)
+        if moves >= self.cells - 2:
+            return 0
+
+        lowest = -((self.cells - 2 - moves) // 2)
+        if alpha < lowest:
+            alpha = lowest
+            if alpha >= beta:
+                return alpha
+        highest = self.table.get(position + mask, (self.cells - 1 - moves) // 2)
+        if beta > highest:
+            beta = highest
+            if alpha >= beta:
+                return beta
+
+        # Try the moves that leave the most threats first
+        candidates = []
+        for col in self.order:
+            move = possible & self.column_masks[col]
+            if move:
+                threats = self.winning_cells(position | move, mask).bit_count()
+                candidates.append((-threats, len(candidates), move))
+        candidates.sort()
+        opponent = position ^ mask
+        for _, _, move in candidates:
+            score = -self.negamax(opponent, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        if len(self.table) >= TABLE_LIMIT:
+            self.table.clear()
+        self.table[position + mask] = alpha
+        return alpha
+
+
+def _slot_hash(key, bits):
+    return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - bits)
+
+
+class SolutionCache:
+    def __init__(self, cols, rows, directory=CACHE_DIR, seed_directory=BOOK_DIR):
+        self.cols = cols
+        self.rows = rows
+        self.log_path = os.path.join(directory, f"{cols}x{rows}.solved")
+        self.index_path = os.path.join(directory, f"{cols}x{rows}.index")
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.log_path):
+            self.seed(os.path.join(seed_directory, f"{cols}x{rows}.solved"))
+        self.log = open(self.log_path, "a+b")  # Every write goes to the end
+        self.index_file = None
+        self.index = None
+        with self.locked():
+            if os.fstat(self.log.fileno()).st_size == 0:
+                self.log.write(LOG_HEADER.pack(LOG_MAGIC, cols, rows))
+                self.log.flush()
+            self.log.seek(0)
+            magic, log_cols, log_rows = LOG_HEADER.unpack(
+                self.log.read(LOG_HEADER.size)
+            )
+            if (magic, log_cols, log_rows) != (LOG_MAGIC, cols, rows):
+                self.log.close()
+                raise ValueError(f"{self.log_path} is not a {cols}x{rows} cache")
+            self.open_index()
+            self.catch_up()
+
+    def seed(self, seed_path):
+        """Starts the log as a copy of the shipped one, if there is one."""
+        if not os.path.exists(seed_path):
+            return
+        temporary = f"{self.log_path}.{os.getpid()}.tmp"
+        shutil.copyfile(seed_path, temporary)
+        try:
+            # Unlike a rename this never replaces a log another process made
+            os.link(temporary, self.log_path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporary)
+
+    def locked(self):
+        return _FileLock(self.lock, self.log)
+
+    def open_index(self):
+        """Maps the index file, building it from the log if it is unusable."""
+        if self.index is not None:
+            self.index.close()
+            self.index_file.close()
+            self.index = None
+        try:
+            self.index_file = open(self.index_path, "r+b")
+            self.index = mmap.mmap(self.index_file.fileno(), 0)
+            magic, slots, _ = INDEX_HEADER.unpack_from(self.index)
+            if magic != INDEX_MAGIC or len(self.index) != (
+                INDEX_HEADER.size + slots * SLOT.size
+            ):
+                raise ValueError(f"{self.index_path} is not a cache index")
+        except (OSError, ValueError, struct.error):
+            if self.index is not None:
+                self.index.close()
+                self.index = None
+            if self.index_file is not None:
+                self.index_file.close()
+            self.rebuild(MIN_SLOTS)
+            return
+        self.slots = slots
+        self.bits = slots.bit_length() - 1
+        self.inode = os.fstat(self.index_file.fileno()).st_ino
+
+    def rebuild(self, slots):
+        """Writes an empty index of ``slots`` slots over the old one and maps it.
+
+        The caller holds the lock; ``catch_up`` then indexes the whole log.
+        """
+        temporary = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, slots, 0))
+            file.truncate(INDEX_HEADER.size + slots * SLOT.size)
+        os.replace(temporary, self.index_path)
+        self.open_index()
+
+    def log_records(self):
+        size = os.fstat(self.log.fileno()).st_size
+        return (size - LOG_HEADER.size) // RECORD.size
+
+    def indexed(self):
+        return INDEX_HEADER.unpack_from(self.index)[2]
+
+    def catch_up(self):
+        """Indexes records other writers appended; the caller holds the lock."""
+        if os.stat(self.index_path).st_ino != self.inode:
+            self.open_index()  # Another process rebuilt it
+        start, end = self.indexed(), self.log_records()
+        if start == end:
+            return
+        if end * 2 > self.slots:
+            slots = self.slots
+            while end * 2 > slots:
+                slots *= 2
+            self.rebuild(slots)
+            start = 0
+        self.log.seek(LOG_HEADER.size + start * RECORD.size)
+        data = self.log.read((end - start) * RECORD.size)
+        for key, score, col in RECORD.iter_unpack(data):
+            self.insert(key, score, col)
+        INDEX_HEADER.pack_into(self.index, 0, INDEX_MAGIC, self.slots, end)
+
+    def find(self, key):
+        """Returns the slot offset holding ``key`` or the empty one it would use."""
+        index, mask = _slot_hash(key, self.bits), self.slots - 1
+        stored = key + 1
+        while True:
+            offset = INDEX_HEADER.size + index * SLOT.size
+            found = int.from_bytes(self.index[offset : offset + 8], "little")
+            if found == stored or found == 0:
+                return offset, found != 0
+            index = (index + 1) & mask
+
+    def insert(self, key, score, col):
+        offset, present = self.find(key)
+        if not present:
+            # Value first, so a concurrent reader never sees a key without it
+            self.index[offset + 8 : offset + 10] = struct.pack("<bB", score, col)
+            self.index[offset : offset + 8] = (key + 1).to_bytes(8, "little")
+
+    def get(self, key):
+        offset, present = self.find(key)
+        if not present:
+            return None
+        _, score, col = SLOT.unpack_from(self.index, offset)
+        return score, col
+
+    def lookup(self, state):
+        """Returns ``(score, best column)`` for ``state``, or None if unsolved."""
+        key, flipped = canonical_key(state)
+        with self.lock:
+            found = self.get(key)
+            if found is None and self.log_records() > self.indexed():
+                with self.locked():
+                    self.catch_up()
+                found = self.get(key)
+        if found is None:
+            return None
+        score, col = found
+        if col == NO_MOVE:
+            return score, None
+        return score, self.cols - 1 - col if flipped else col
+
+    def store(self, state, score, col):
+        key, flipped = canonical_key(state)
+        if col is None:
+            col = NO_MOVE
+        elif flipped:
+            col = self.cols - 1 - col
+        with self.locked():
+            self.catch_up()
+            if self.get(key) is not None:
+                return
+            self.log.write(RECORD.pack(key, score, col))
+            self.log.flush()
+            self.catch_up()
+
+    def close(self):
+        with self.lock:
+            self.index.close()
+            self.index_file.close()
+            self.log.close()
+
+
+class _FileLock:
+    """Holds a thread lock and an exclusive lock on a shared file."""
+
+    def __init__(self, lock, file):
+        self.lock = lock
+        self.file = file
+
+    def __enter__(self):
+        self.lock.acquire()
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.lock.release()
+
+
+def load_cache(cols, rows, directory=CACHE_DIR):
+    """Returns the shared cache for a solved board size, or None.
+
+    None is also returned, for good, if the cache cannot be opened.
+    """
+    if (cols, rows) not in SOLVED_SIZES:
+        return None
+    with _solvers_lock:
+        if (cols, rows, directory) not in _caches:
+            try:
+                cache = SolutionCache(cols, rows, directory)
+            except (OSError, ValueError):
+                cache = None  # Unwritable or damaged; the bot searches instead
+            _caches[(cols, rows, directory)] = cache
+        return _caches[(cols, rows, directory)]
+
+
+def solve_position(state, time_budget=None, stop_event=None, directory=CACHE_DIR):
+    """Returns the cached ``(score, best column)``, solving and caching on a miss.
+
+    Returns None for boards that are not solved, if the cache is unusable
+    or if the solve is cut off.
+    """
+    cache = load_cache(state.cols, state.rows, directory)
+    if cache is None:
+        return None
+    try:
+        found = cache.lookup(state)
+    except OSError:
+        return None
+    if found is not None:
+        return found
+    with _solvers_lock:
+        if (state.cols, state.rows) not in _solvers:
+            _solvers[(state.cols, state.rows)] = Solver(state.cols, state.rows)
+        solver = _solvers[(state.cols, state.rows)]
+    # One search at a time per size, so the table is never shared mid-search
+    with solver.lock:
+        try:
+            score, col = solver.solve(state, time_budget, stop_event)
+        except SolveAborted:
+            return None
+    try:
+        cache.store(state, score, col)
+    except OSError:
+        pass  # Still the right move, just not remembered
+    return score, col
+
+
+def presolve(cols, rows, plies, directory=CACHE_DIR):
+    """Solves the positions either side can face in the first ``plies`` moves
+    against perfect play, so the bot answers them from the cache."""
+    solved = 0
+    for side in (0, 1):
+        pending = [[]]
+        while pending:
+            moves = pending.pop()
+            state = GameState(cols, rows)
+            for move in moves:
+                state.play(move)
+            if len(moves) >= plies or not state.legal_moves():
+                continue
+            if state.current_player == side:
+                _, col = solve_position(state, directory=directory)
+                solved += 1
+                if not state.is_winning_move(col):
+                    pending.append(moves + [col])
+            else:
+                for col in state.legal_moves():
+                    if not state.is_winning_move(col):
+                        pending.append(moves + [col])
+    return solved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-solve small board openings")
+    parser.add_argument(
+        "--cols", type=int, nargs="+", default=[cols for cols, _ in SOLVED_SIZES]
+    )
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--plies", type=int, default=8)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+
+    for cols in args.cols:
+        start = time.perf_counter()
+        count = presolve(cols, args.rows, args.plies, args.cache_dir)
+        elapsed = time.perf_counter() - start
+        print(f"{cols}x{args.rows}: {count} positions in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
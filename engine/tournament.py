@@ -0,0 +1,207 @@
+"""Headless self-play runner for comparing bot engines.
+
+Plays N games between two engines on any board size, alternating who
+moves first, spreads the games over the shared process pool and prints a
+win/draw/loss table, an Elo difference estimate and games per second:
+
+    python -m engine.tournament level3 level6 --games 200 --cols 7
+
+Engines are ``random``, ``heuristic`` (the original one-ply bot: win,
+block, else prefer the center) and ``level1`` to ``level6`` (the bot
+difficulty levels, played through ``engine.bot.choose_move`` exactly as
+in a bot game, solver and opening book included).
+"""
+
+import argparse
+import math
+import os
+import random
+import time
+from engine.game_state import GameState
+from engine.search import DIFFICULTY_LEVELS
+from engine.bot import choose_move, make_searcher
+from engine.opening_book import load_book
+from engine.parallel import get_pool
+
+DRAW = -1
+GAMES_PER_TASK = 4
+
+_players = {}
+
+
+def random_move(state):
+    return random.choice(state.legal_moves())
+
+
+def heuristic_move(state):
+    player = state.current_player
+    center_column = state.cols // 2
+    best_score = -float("inf")
+    legal_moves = state.legal_moves()
+    best_col = random.choice(legal_moves)
+    for col in legal_moves:
+        if state.is_winning_move(col, player):
+            return col
+        score = 1000 if state.is_winning_move(col, player ^ 1) else 0
+        score += (state.cols // 2 - abs(col - center_column)) * 10
+        if score > best_score:
+            best_score = score
+            best_col = col
+    return best_col
+
+
+def make_player(name, cols, rows):
+    """Returns a function choosing a column for the player to move."""
+    if name == "random":
+        return random_move
+    if name == "heuristic":
+        return heuristic_move
+    if not name.startswith("level") or int(name[5:]) not in DIFFICULTY_LEVELS:
+        raise ValueError(f"Unknown engine {name!r}")
+
+    difficulty = int(name[5:])
+    if DIFFICULTY_LEVELS[difficulty][0] == "parallel":
+        raise ValueError(f"{name} already uses every core, run it in a bot game")
+    searcher = make_searcher(difficulty, cols, rows, seed=random.getrandbits(32))
+    book = load_book(cols, rows)
+
+    def choose(state):
+        return choose_move(state, difficulty, searcher, book)
+
+    return choose
+
+
+def get_player(name, cols, rows):
+    """Players are cached per process so search tables stay warm."""
+    if (name, cols, rows) not in _players:
+        _players[(name, cols, rows)] = make_player(name, cols, rows)
+    return _players[(name, cols, rows)]
+
+
+def play_game(first, second, cols, rows, seed, random_plies):
+    """Plays one game and returns ``(winner, plies)``.
+
+    The winner is 0 for ``first``, 1 for ``second`` or DRAW. The opening
+    ``random_plies`` moves are random so deterministic engines do not
+    replay the same game every time.
+    """
+    random.seed(seed)
+    players = (get_player(first, cols, rows), get_player(second, cols, rows))
+    state = GameState(cols, rows)
+    for _ in range(random_plies):
+        quiet = [col for col in state.legal_moves() if not state.is_winning_move(col)]
+        if not quiet:
+            break
+        state.play(random.choice(quiet))
+    while not state.is_full():
+        state.play(players[state.current_player](state))
+        if state.has_won(state.last_player):
+            return state.last_player, len(state.moves)
+    return DRAW, len(state.moves)
+
+
+def _play_games(engines, cols, rows, games, random_plies, seed):
+    """Pool task: returns ``(winning engine index or DRAW, plies)`` per game.
+
+    Even games are started by the first engine, odd games by the second.
+    """
+    results = []
+    for game in games:
+        swapped = game % 2
+        first, second = engines[::-1] if swapped else engines
+        winner, plies = play_game(
+            first, second, cols, rows, seed * 1000003 + game, random_plies
+        )
+        if winner != DRAW and swapped:
+            winner ^= 1
+        results.append((winner, plies))
+    return results
+
+
+def elo_difference(score):
+    """Elo gap implied by an expected score strictly between 0 and 1."""
+    return -400 * math.log10(1 / score - 1)
+
+
+def run_tournament(engines, games, cols=7, rows=6, workers=1, random_plies=2, seed=1):
+    """Plays ``games`` games and returns the list of per-game results."""
+    chunks = [
+        list(range(start, min(start + GAMES_PER_TASK, games)))
+        for start in range(0, games, GAMES_PER_TASK)
+    ]
+    args = (engines, cols, rows)
+    if workers > 1:
+        batches = get_pool(workers).map(
+            _play_games,
+            *[[value] * len(chunks) for value in args],
+            chunks,
+            [random_plies] * len(chunks),
+            [seed] * len(chunks),
+        )
+    else:
+        batches = (_play_games(*args, chunk, random_plies, seed) for chunk in chunks)
+    return [result for batch in batches for result in batch]
+
+
+def report(engines, results, elapsed):
+    games = len(results)
+    wins = [sum(1 for winner, _ in results if winner == index) for index in (0, 1)]
+    draws = games - wins[0] - wins[1]
+    plies = sum(count for _, count in results)
+
+    print(f"{'engine':<12} {'wins':>6} {'draws':>6} {'losses':>6} {'score':>7}")
+    for index, name in enumerate(engines):
+        score = (wins[index] + draws / 2) / games
+        print(
+            f"{name:<12} {wins[index]:>6} {draws:>6} {wins[index ^ 1]:>6} "
+            f"{score:>6.1%}"
+        )
+
+    score = (wins[0] + draws / 2) / games
+    if 0 < score < 1:
+        # 95% interval from the standard error of the mean score
+        margin = 1.96 * math.sqrt(score * (1 - score) / games)
+        low = elo_difference(max(score - margin, 1e-6))
+        high = elo_difference(min(score + margin, 1 - 1e-6))
+        print(
+            f"Elo {engines[0]} - {engines[1]}: {elo_difference(score):+.0f} "
+            f"(95% {low:+.0f} .. {high:+.0f})"
+        )
+    else:
+        print(f"Elo {engines[0]} - {engines[1]}: unbounded (one side won every game)")
+    print(
+        f"{games} games in {elapsed:.1f}s: {games / elapsed:.2f} games/s, "
+        f"{plies / elapsed:.0f} moves/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless bot tournament")
+    parser.add_argument("engines", nargs=2)
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--random-plies", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for name in args.engines:
+        make_player(name, args.cols, args.rows)  # Fail fast on bad names
+    start = time.perf_counter()
+    results = run_tournament(
+        args.engines,
+        args.games,
+        args.cols,
+        args.rows,
+        args.workers,
+        args.random_plies,
+        args.seed,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"{args.cols}x{args.rows}, {args.engines[0]} vs {args.engines[1]}")
+    report(args.engines, results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
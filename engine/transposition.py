@@ -0,0 +1,130 @@
+"""Zobrist keys and a fixed-size transposition table for the bot search.
+
+Entries live in two flat ``array('Q')`` buffers (key and packed data), so
+the table never grows past the size it was created with. Every bucket
+holds two slots: the first keeps the deepest result seen for that bucket,
+the second is always overwritten by the newest one (two-tier replacement).
+"""
+
+import random
+from array import array
+
+DEFAULT_SIZE_MB = 16
+SLOT_BYTES = 16  # 8 bytes of key + 8 bytes of packed data
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Packed data layout: score | depth (7 bits) | bound (2 bits) | move + 1 (4 bits)
+SCORE_OFFSET = 1 << 20
+SCORE_SHIFT = 16
+DEPTH_SHIFT = 6
+BOUND_SHIFT = 4
+
+
+class ZobristKeys:
+    """Random keys per (player, cell) plus their left-right mirrored twins.
+
+    Cells are indexed by bit position in the GameState layout, so a move's
+    key is looked up straight from the bit it sets.
+    """
+
+    def __init__(self, cols, rows, seed=2024):
+        rng = random.Random(seed)
+        stride = rows + 1
+        size = cols * stride
+        self.empty = rng.getrandbits(64)
+        self.keys = ([0] * size, [0] * size)
+        for player in (0, 1):
+            for bit in range(size):
+                self.keys[player][bit] = rng.getrandbits(64)
+        self.mirror_keys = ([0] * size, [0] * size)
+        for player in (0, 1):
+            keys = self.keys[player]
+            for col in range(cols):
+                mirrored_col = cols - 1 - col
+                for row in range(stride):
+                    bit = col * stride + row
+                    self.mirror_keys[player][bit] = keys[mirrored_col * stride + row]
+
+    def hash_state(self, state):
+        """Returns ``(key, mirrored_key)`` of a GameState from scratch."""
+        key = mirrored = self.empty
+        for player in (0, 1):
+            board = state.boards[player]
+            while board:
+                low = board & -board
+                bit = low.bit_length() - 1
+                key ^= self.keys[player][bit]
+                mirrored ^= self.mirror_keys[player][bit]
+                board ^= low
+        return key, mirrored
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=DEFAULT_SIZE_MB):
+        buckets = 1
+        while buckets * 4 * SLOT_BYTES <= size_mb * (1 << 20):
+            buckets *= 2
+        self.size_mb = size_mb
+        self.index_mask = buckets - 1
+        self.keys = array("Q", [0]) * (buckets * 2)
+        self.data = array("Q", [0]) * (buckets * 2)
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        """Returns the packed data stored for ``key``, or 0 when absent."""
+        index = (key & self.index_mask) << 1
+        keys = self.keys
+        if keys[index] == key:
+            self.hits += 1
+            return self.data[index]
+        if keys[index + 1] == key:
+            self.hits += 1
+            return self.data[index + 1]
+        self.misses += 1
+        if keys[index] or keys[index + 1]:
+            # The bucket is taken by other positions
+            self.collisions += 1
+        return 0
+
+    def store(self, key, score, depth, bound, move):
+        data = (
+            ((score + SCORE_OFFSET) << SCORE_SHIFT)
+            | (depth << DEPTH_SHIFT)
+            | (bound << BOUND_SHIFT)
+            | (move + 1)
+        )
+        index = (key & self.index_mask) << 1
+        if self.keys[index] == key or depth >= (self.data[index] >> DEPTH_SHIFT) & 127:
+            self.keys[index] = key
+            self.data[index] = data
+        else:
+            self.keys[index + 1] = key
+            self.data[index + 1] = data
+
+    def clear(self):
+        for buffer in (self.keys, self.data):
+            buffer[:] = array("Q", [0]) * len(buffer)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def stats(self):
+        probes = self.hits + self.misses
+        used = sum(1 for key in self.keys if key)
+        return {
+            "size_mb": self.size_mb,
+            "slots": len(self.keys),
+            "used": used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
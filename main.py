@@ -1,49 +1,82 @@
+import os
+import sys
 from tkinter import Tk
-import screens.login_screen as login_screen
-import screens.registration_screen as registration_screen
-import screens.home_screen as home_screen
-import boards.board as board
-import boards.bot_board as bot_board
-import boards.online_board as online_board
 from contants.app_const import WINDOW_SIZE
+from diagnostics.instrument import bind_capture_key
+
+# Screens and boards are imported the first time they are shown, so a cold
+# start only pays for the login screen. Set this to paint the first frame,
+# print "first frame" and exit; benchmarks/startup.py times how long that
+# line takes to appear.
+FIRST_FRAME_ENV = "CONNECT4_FIRST_FRAME"
 
 
 def main():
     window = Tk()
     window.title("Login & Registration System")
     window.geometry(WINDOW_SIZE)
+    bind_capture_key(window)
 
     def show_login():
+        import screens.login_screen as login_screen
+
         login_screen.show_login_form(window, show_registration, show_home)
 
     def show_registration():
+        import screens.registration_screen as registration_screen
+
         registration_screen.show_registration_form(window, show_login)
 
     def show_home(username):
+        import screens.home_screen as home_screen
+
         for widget in window.winfo_children():
             widget.destroy()
         home_screen.show_home_screen(
-            window, username, start_game, start_bot_game, start_online_game
+            window,
+            username,
+            start_game,
+            start_bot_game,
+            start_online_game,
+            start_replay,
         )
 
     def start_game(size, username):
+        import boards.board as board
+
         for widget in window.winfo_children():
             widget.destroy()
         board.create_game_board(size, window, username, show_home)
 
-    def start_bot_game(size, username):
+    def start_bot_game(size, username, difficulty):
+        import boards.bot_board as bot_board
+
         for widget in window.winfo_children():
             widget.destroy()
-        bot_board.create_game_board(size, window, username, show_home)
+        bot_board.create_game_board(size, window, username, show_home, difficulty)
+
+    def start_online_game(isHost, size, ip, port, username, watch_match=None):
+        import boards.online_board as online_board
 
-    def start_online_game(isHost, size, ip, port, username):
         for widget in window.winfo_children():
             widget.destroy()
         online_board.create_game_board(
-            size, window, isHost, ip, port, username, show_home
+            size, window, isHost, ip, port, username, show_home, watch_match
         )
 
+    def start_replay(username):
+        import boards.replay_board as replay_board
+
+        for widget in window.winfo_children():
+            widget.destroy()
+        replay_board.create_replay_board(window, username, show_home)
+
     show_login()
+    if os.environ.get(FIRST_FRAME_ENV):
+        window.update()  # Maps and paints the login screen
+        print("first frame", flush=True)
+        window.destroy()
+        sys.exit()
     window.mainloop()
 
 
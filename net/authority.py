@@ -0,0 +1,143 @@
+"""Compact authoritative match state for the game server.
+
+A running match only needs two integers and its move log: the stones of
+the player to move and the mask of all stones, in the same column layout
+as GameState, plus one byte per move for spectators and resyncs.
+Everything that depends on the board size alone (masks, line directions)
+lives in one shared Geometry per size, so a server process can validate
+moves for many matches at once.
+
+Run ``python -m net.authority`` to measure per-move validation latency.
+"""
+
+import argparse
+import random
+import sys
+import time
+from engine.game_state import GameState, has_four
+
+ILLEGAL = -1
+ONGOING = 0
+WIN = 1
+DRAW = 2
+
+_geometries = {}
+
+
+class Geometry:
+    __slots__ = ("cols", "rows", "cells", "directions", "bottom", "top", "columns")
+
+    def __init__(self, cols, rows):
+        stride = rows + 1
+        self.cols = cols
+        self.rows = rows
+        self.cells = cols * rows
+        self.directions = (1, stride, stride + 1, stride - 1)
+        # Per column: lowest cell, highest playable cell, every playable cell
+        self.bottom = tuple(1 << (col * stride) for col in range(cols))
+        self.top = tuple(1 << (col * stride + rows - 1) for col in range(cols))
+        self.columns = tuple(((1 << rows) - 1) << (col * stride) for col in range(cols))
+
+
+def get_geometry(cols, rows):
+    if (cols, rows) not in _geometries:
+        _geometries[(cols, rows)] = Geometry(cols, rows)
+    return _geometries[(cols, rows)]
+
+
+class MatchState:
+    __slots__ = ("geometry", "position", "mask", "moves", "log")
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        self.position = 0  # Stones of the player to move
+        self.mask = 0  # Stones of both players
+        self.moves = 0
+        self.log = bytearray()  # Column of every move so far
+
+    @property
+    def current_player(self):
+        return self.moves & 1
+
+    def play(self, col):
+        """Validates and applies a move for the player to move.
+
+        Returns ILLEGAL (the state is unchanged), ONGOING, WIN or DRAW.
+        """
+        geometry = self.geometry
+        if not 0 <= col < geometry.cols or self.mask & geometry.top[col]:
+            return ILLEGAL
+        stone = (self.mask + geometry.bottom[col]) & geometry.columns[col]
+        mine = self.position | stone
+        self.mask |= mine
+        self.position = mine ^ self.mask
+        self.moves += 1
+        self.log.append(col)
+        if has_four(mine, geometry.directions):
+            return WIN
+        if self.moves == geometry.cells:
+            return DRAW
+        return ONGOING
+
+
+def match_size(state):
+    """Bytes held by one match, not counting the shared geometry."""
+    return (
+        sys.getsizeof(state)
+        + sys.getsizeof(state.position)
+        + sys.getsizeof(state.mask)
+        + sys.getsizeof(state.moves)
+        + sys.getsizeof(state.log)
+    )
+
+
+def measure_latency(games, cols, rows, seed=1):
+    """Plays random games and returns the sorted per-move latencies in ns."""
+    rng = random.Random(seed)
+    geometry = get_geometry(cols, rows)
+    clock = time.perf_counter_ns
+    latencies = []
+    for _ in range(games):
+        state = MatchState(geometry)
+        result = ONGOING
+        while result == ONGOING:
+            col = rng.randrange(cols)
+            start = clock()
+            result = state.play(col)
+            latencies.append(clock() - start)
+            if result == ILLEGAL:
+                result = ONGOING
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move validation benchmark")
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--rows", type=int, default=6)
+    args = parser.parse_args()
+
+    latencies = measure_latency(args.games, args.cols, args.rows)
+    count = len(latencies)
+    print(
+        f"{count} moves validated: "
+        f"p50 {latencies[count // 2]} ns, "
+        f"p99 {latencies[count * 99 // 100]} ns, "
+        f"max {latencies[-1]} ns"
+    )
+
+    state = MatchState(get_geometry(args.cols, args.rows))
+    game = GameState(args.cols, args.rows)
+    for col in range(args.cols):
+        state.play(col)
+        game.play(col)
+    game_size = sys.getsizeof(game) + sum(
+        sys.getsizeof(getattr(game, name))
+        for name in ("height", "top", "boards", "moves", "directions")
+    )
+    print(f"{match_size(state)} bytes per match, GameState uses {game_size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Fan-out of one match's frames to its spectators.
+
+Each published frame is encoded once and the same bytes object is written
+to every subscriber's transport. Spectators share the match's sequence
+numbers, so a subscriber starts (and later resyncs) with a SNAPSHOT
+numbered like the last frame published and then expects the next one.
+
+A spectator whose socket cannot keep up has its transport paused by
+asyncio. It is skipped while paused, and once its buffer drains it gets a
+fresh SNAPSHOT instead of the frames it missed. The frame that ends the
+match reaches every spectator, lagging or not: the lagging ones get it
+right after a SNAPSHOT of the final position.
+"""
+
+from net import protocol
+
+SPECTATOR_HIGH_WATER = 16 * 1024
+
+
+class Broadcast:
+    def __init__(self, state):
+        self.state = state
+        self.subscribers = set()
+        self.seq = 0
+        self.frames = 0
+
+    def snapshot(self):
+        geometry = self.state.geometry
+        payload = protocol.encode_snapshot(
+            geometry.cols, geometry.rows, 0, self.state.log
+        )
+        return protocol.encode_frame(protocol.SNAPSHOT, self.seq, payload)
+
+    def subscribe(self, spectator):
+        spectator.transport.set_write_buffer_limits(high=SPECTATOR_HIGH_WATER)
+        self.subscribers.add(spectator)
+        spectator.transport.write(self.snapshot())
+
+    def unsubscribe(self, spectator):
+        self.subscribers.discard(spectator)
+
+    def resync(self, spectator):
+        """Catches up a spectator whose transport has resumed writing."""
+        if spectator in self.subscribers:
+            spectator.transport.write(self.snapshot())
+
+    def publish(self, msg_type, payload=b"", final=False):
+        """Sends a frame to every spectator keeping up.
+
+        With ``final`` (RESULT or RESIGN) lagging spectators get it too.
+        """
+        catch_up = self.snapshot() if final and self.subscribers else None
+        self.seq += 1
+        if not self.subscribers:
+            return
+        frame = protocol.encode_frame(msg_type, self.seq, payload)
+        for spectator in self.subscribers:
+            if spectator.lagging:
+                if not final:
+                    continue
+                spectator.transport.write(catch_up)
+            spectator.transport.write(frame)
+            self.frames += 1
+
+    def close(self):
+        for spectator in self.subscribers:
+            spectator.watching = None
+            spectator.transport.close()
+        self.subscribers.clear()
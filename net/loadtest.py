@@ -0,0 +1,165 @@
+"""Load generator for the matchmaking server.
+
+Opens ``--idle`` connections that never send anything, ``--pairs`` pairs
+of random-move players that keep joining and finishing games and
+``--spectators`` clients watching the latest match, then reports the moves
+per second played and the frames per second fanned out to spectators:
+
+    python -m net.server --report-interval 5 &
+    python -m net.loadtest --idle 10000 --pairs 50 --duration 20
+    python -m net.loadtest --idle 0 --pairs 1 --spectators 500
+
+Run the load generator in its own process: every connection costs one file
+descriptor on each side.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from engine.game_state import GameState
+from net import protocol
+from net.server import raise_file_limit
+
+
+class BotClient:
+    """A random mover speaking the wire protocol over asyncio streams."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.frames = protocol.FrameReader(256)
+        self.send_seq = 0
+        self.pending = []
+        self.moves = 0
+        self.watched = 0
+
+    def send(self, msg_type, payload=b""):
+        self.send_seq += 1
+        self.writer.write(protocol.encode_frame(msg_type, self.send_seq, payload))
+
+    async def receive(self):
+        while not self.pending:
+            data = await self.reader.read(4096)
+            if not data:
+                return None
+            self.frames.feed(data)
+            self.pending.extend(self.frames.frames())
+        return self.pending.pop(0)
+
+    async def play(self, cols, rows, rng):
+        """Joins one game and plays it out, counting the moves made."""
+        hello = protocol.HELLO_PAYLOAD.pack(protocol.PROTOCOL_VERSION, cols, rows)
+        self.send(protocol.HELLO, hello)
+        frame = await self.receive()
+        if frame is None or frame[0] != protocol.START:
+            return
+        seat, cols, rows, _, _ = protocol.decode_start(frame[2])
+        state = GameState(cols, rows)
+        while True:
+            over = state.moves and (state.has_won(state.last_player) or state.is_full())
+            if state.current_player == seat and not over:
+                col = rng.choice(state.legal_moves())
+                state.play(col)
+                self.send(protocol.MOVE, protocol.MOVE_PAYLOAD.pack(col))
+                self.moves += 1
+                continue
+            # The server follows the game ending move with a RESULT
+            frame = await self.receive()
+            if frame is None or frame[0] != protocol.MOVE:
+                return
+            state.play(protocol.decode_move(frame[2]))
+
+    async def watch(self):
+        """Spectates the latest match until it ends, counting frames."""
+        self.send(protocol.WATCH, protocol.WATCH_PAYLOAD.pack(0))
+        while await self.receive() is not None:
+            self.watched += 1
+
+
+async def play_forever(host, port, cols, rows, counter, seed):
+    rng = random.Random(seed)
+    while True:
+        reader, writer = await asyncio.open_connection(host, port)
+        client = BotClient(reader, writer)
+        try:
+            await client.play(cols, rows, rng)
+        except ConnectionError:
+            pass  # The server closes finished games
+        finally:
+            counter[0] += client.moves
+        writer.close()
+
+
+async def watch_forever(host, port, counter):
+    while True:
+        reader, writer = await asyncio.open_connection(host, port)
+        client = BotClient(reader, writer)
+        try:
+            await client.watch()
+        except ConnectionError:
+            pass
+        finally:
+            counter[1] += client.watched
+        writer.close()
+        await asyncio.sleep(0.1)  # No match may be running yet
+
+
+async def run(host, port, idle, pairs, spectators, duration, cols, rows):
+    idle_connections = []
+    for start in range(0, idle, 500):
+        batch = [
+            asyncio.open_connection(host, port) for _ in range(min(500, idle - start))
+        ]
+        idle_connections.extend(await asyncio.gather(*batch))
+    print(f"{len(idle_connections)} idle connections open")
+
+    counter = [0, 0]
+    players = [
+        asyncio.ensure_future(play_forever(host, port, cols, rows, counter, seed))
+        for seed in range(2 * pairs)
+    ]
+    players += [
+        asyncio.ensure_future(watch_forever(host, port, counter))
+        for _ in range(spectators)
+    ]
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    print(f"{counter[0]} moves in {elapsed:.1f}s: {counter[0] / elapsed:.0f} moves/s")
+    if spectators:
+        print(f"{counter[1] / elapsed:.0f} frames/s received by spectators")
+    for player in players:
+        player.cancel()
+    for _, writer in idle_connections:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matchmaking server load test")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--idle", type=int, default=10000)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--spectators", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--rows", type=int, default=6)
+    args = parser.parse_args()
+    raise_file_limit()
+    asyncio.run(
+        run(
+            args.host,
+            args.port,
+            args.idle,
+            args.pairs,
+            args.spectators,
+            args.duration,
+            args.cols,
+            args.rows,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
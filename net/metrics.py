@@ -0,0 +1,225 @@
+"""Latency and throughput counters for online connections.
+
+Every FramedConnection keeps a ConnectionMetrics. Alongside the frame and
+byte counters it records three latencies, one for each place lag can come
+from:
+
+- ``rtt``: PING to matching PONG, i.e. the network and the peer;
+- ``dispatch``: a frame leaving the receive thread until its Tk handler runs;
+- ``loop_lag``: how late the Tk event loop fires a periodic timer.
+
+``snapshot`` turns them into a flat dict that the in-game overlay shows and
+``to_prometheus`` renders in the Prometheus text exposition format.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # Windows
+    fcntl = None
+
+LATENCY_SAMPLES = 128
+
+# name -> (type, help); latencies are summaries of p50/p99 over the recent
+# samples plus the sum and count of every sample so far
+METRICS = {
+    "frames_sent_total": ("counter", "Frames sent on the connection."),
+    "frames_received_total": ("counter", "Frames received on the connection."),
+    "bytes_sent_total": ("counter", "Bytes sent on the connection."),
+    "bytes_received_total": ("counter", "Bytes received on the connection."),
+    "frames_sent_per_second": ("gauge", "Send rate since the previous snapshot."),
+    "frames_received_per_second": (
+        "gauge",
+        "Receive rate since the previous snapshot.",
+    ),
+    "send_queue_bytes": ("gauge", "Bytes in the kernel send queue."),
+    "receive_queue_bytes": ("gauge", "Bytes waiting in the kernel receive queue."),
+    "rtt_seconds": ("summary", "PING to PONG round-trip time."),
+    "dispatch_delay_seconds": (
+        "summary",
+        "Delay from the receive thread to the Tk handler.",
+    ),
+    "loop_lag_seconds": ("summary", "How late the Tk event loop runs its timers."),
+    # Matchmaking server
+    "clients": ("gauge", "Connected clients."),
+    "waiting_clients": ("gauge", "Clients waiting for an opponent."),
+    "matches": ("gauge", "Running matches."),
+    "moves_total": ("counter", "Moves validated."),
+    "validation_seconds": ("summary", "Per-move validation latency."),
+}
+
+
+def socket_queues(sock):
+    """Returns ``(send queue, receive queue)`` in bytes, or Nones if unknown."""
+    if fcntl is None or sock is None:
+        return None, None
+    try:
+        buffer = bytearray(4)
+        fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, buffer)
+        send_queue = int.from_bytes(buffer, "little")
+        fcntl.ioctl(sock.fileno(), termios.FIONREAD, buffer)
+        return send_queue, int.from_bytes(buffer, "little")
+    except (OSError, AttributeError, ValueError):
+        return None, None
+
+
+def percentile(samples, point):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, len(ordered) * point // 100)]
+
+
+def summary(samples, total, count):
+    """A latency summary as stored in snapshots: quantiles, sum and count."""
+    return {
+        "0.5": percentile(samples, 50),
+        "0.99": percentile(samples, 99),
+        "sum": total,
+        "count": count,
+    }
+
+
+class ConnectionMetrics:
+    """Counters updated from the sending and receiving threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.rtts = deque(maxlen=LATENCY_SAMPLES)
+        self.dispatch_delays = deque(maxlen=LATENCY_SAMPLES)
+        self.loop_lags = deque(maxlen=LATENCY_SAMPLES)
+        # name -> [count, sum] of every latency recorded, not just the recent
+        self.latency_totals = {
+            "rtt_seconds": [0, 0.0],
+            "dispatch_delay_seconds": [0, 0.0],
+            "loop_lag_seconds": [0, 0.0],
+        }
+        self.last_snapshot = (time.monotonic(), 0, 0)
+
+    def on_send(self, size):
+        with self.lock:
+            self.frames_sent += 1
+            self.bytes_sent += size
+
+    def on_receive(self, frames, size):
+        with self.lock:
+            self.frames_received += frames
+            self.bytes_received += size
+
+    def record_latency(self, name, samples, seconds):
+        samples.append(seconds)
+        with self.lock:
+            totals = self.latency_totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def record_pong(self, clock):
+        """``clock`` is the monotonic_ns stamp our PING carried."""
+        seconds = (time.monotonic_ns() - clock) / 1e9
+        self.record_latency("rtt_seconds", self.rtts, seconds)
+
+    def record_dispatch(self, received):
+        seconds = time.monotonic() - received
+        self.record_latency("dispatch_delay_seconds", self.dispatch_delays, seconds)
+
+    def record_loop_lag(self, lag):
+        self.record_latency("loop_lag_seconds", self.loop_lags, max(lag, 0.0))
+
+    def snapshot(self, sock=None):
+        now = time.monotonic()
+        with self.lock:
+            sent, received = self.frames_sent, self.frames_received
+            values = {
+                "frames_sent_total": sent,
+                "frames_received_total": received,
+                "bytes_sent_total": self.bytes_sent,
+                "bytes_received_total": self.bytes_received,
+            }
+            totals = {name: tuple(pair) for name, pair in self.latency_totals.items()}
+        then, sent_before, received_before = self.last_snapshot
+        self.last_snapshot = (now, sent, received)
+        elapsed = max(now - then, 1e-9)
+        values["frames_sent_per_second"] = (sent - sent_before) / elapsed
+        values["frames_received_per_second"] = (received - received_before) / elapsed
+        values["send_queue_bytes"], values["receive_queue_bytes"] = socket_queues(sock)
+        for name, samples in (
+            ("rtt_seconds", self.rtts),
+            ("dispatch_delay_seconds", self.dispatch_delays),
+            ("loop_lag_seconds", self.loop_lags),
+        ):
+            count, total = totals[name]
+            values[name] = summary(list(samples), total, count)
+        return values
+
+
+def format_overlay(values):
+    """A few short lines for the in-game overlay."""
+
+    def ms(quantiles):
+        median, tail = quantiles["0.5"], quantiles["0.99"]
+        if median is None:
+            return "n/a"
+        return f"{median * 1000:.1f}/{tail * 1000:.1f} ms"
+
+    send_queue = values["send_queue_bytes"]
+    receive_queue = values["receive_queue_bytes"]
+    queues = "n/a" if send_queue is None else f"{send_queue}/{receive_queue} B"
+    return "\n".join(
+        [
+            f"RTT p50/p99: {ms(values['rtt_seconds'])}",
+            f"Dispatch p50/p99: {ms(values['dispatch_delay_seconds'])}",
+            f"Tk lag p50/p99: {ms(values['loop_lag_seconds'])}",
+            f"Frames/s out/in: {values['frames_sent_per_second']:.1f}/"
+            f"{values['frames_received_per_second']:.1f}",
+            f"Send/recv queue: {queues}",
+        ]
+    )
+
+
+def to_prometheus(values, prefix="connect4_", labels=None):
+    """Renders a snapshot in the Prometheus text exposition format."""
+    base = ",".join(f'{key}="{value}"' for key, value in (labels or {}).items())
+    lines = []
+    for name, value in values.items():
+        kind, help_text = METRICS.get(name, ("gauge", name))
+        lines.append(f"# HELP {prefix}{name} {help_text}")
+        lines.append(f"# TYPE {prefix}{name} {kind}")
+        if isinstance(value, dict):
+            # A summary: one series per quantile, then _sum and _count
+            series = [
+                (f"{name}{suffix}", quantile, value[key])
+                for key, suffix, quantile in (
+                    ("0.5", "", "0.5"),
+                    ("0.99", "", "0.99"),
+                    ("sum", "_sum", None),
+                    ("count", "_count", None),
+                )
+            ]
+        else:
+            series = [(name, None, value)]
+        for series_name, quantile, number in series:
+            if number is None:
+                continue
+            label = base
+            if quantile is not None:
+                label = ",".join(filter(None, [base, f'quantile="{quantile}"']))
+            label = "{" + label + "}" if label else ""
+            lines.append(f"{prefix}{series_name}{label} {number}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, text):
+    """Replaces ``path`` atomically so scrapers never read half a file."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        file.write(text)
+    os.replace(temporary, path)
@@ -0,0 +1,302 @@
+"""Length-prefixed binary wire protocol for online games.
+
+Every frame is a 7 byte header (message type, sequence number, payload
+length, network byte order) followed by the payload. Readers keep one
+reusable buffer per connection, so partial reads and several frames
+arriving in one segment are handled without decoding anything as text.
+
+Run ``python -m net.protocol`` for a loopback throughput benchmark.
+"""
+
+import argparse
+import socket
+import struct
+import threading
+import time
+from net.metrics import ConnectionMetrics
+from diagnostics.instrument import timed
+
+PROTOCOL_VERSION = 4
+
+HELLO = 1
+MOVE = 2
+GAME_OVER = 3
+PING = 4
+PONG = 5
+RESIGN = 6
+START = 7  # Sent by a matchmaking server once a game has been found
+ERROR = 8
+RESULT = 9  # Pushed by a matchmaking server when a game ends
+SNAPSHOT = 10  # Moves of a match from a given index, restarts the sequence
+WATCH = 11  # Asks a matchmaking server to spectate a match
+RESUME = 12  # Reattaches to a server match after the connection dropped
+
+HEADER = struct.Struct("!BIH")  # type, sequence number, payload length
+HELLO_PAYLOAD = struct.Struct("!BBB")  # version, cols, rows
+TOKEN_BYTES = 16
+# seat (0 moves first), cols, rows, match id, resume token
+START_PAYLOAD = struct.Struct(f"!BBBI{TOKEN_BYTES}s")
+RESUME_PAYLOAD = struct.Struct(f"!B{TOKEN_BYTES}sH")  # version, token, moves known
+WATCH_PAYLOAD = struct.Struct("!I")  # match id, 0 for any running match
+SNAPSHOT_HEADER = struct.Struct("!BBB")  # cols, rows, index of the first move
+MOVE_PAYLOAD = struct.Struct("!B")  # column
+RESULT_PAYLOAD = struct.Struct("!B")  # winning seat or NO_WINNER
+PING_PAYLOAD = struct.Struct("!Q")  # sender clock in nanoseconds
+
+NO_WINNER = 255
+
+READ_BUFFER_SIZE = 64 * 1024
+MAX_PAYLOAD = 0xFFFF
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(msg_type, seq, payload=b""):
+    return HEADER.pack(msg_type, seq, len(payload)) + payload
+
+
+def encode_hello(seq, cols, rows):
+    return encode_frame(HELLO, seq, HELLO_PAYLOAD.pack(PROTOCOL_VERSION, cols, rows))
+
+
+def encode_move(seq, col):
+    return encode_frame(MOVE, seq, MOVE_PAYLOAD.pack(col))
+
+
+def encode_game_over(seq, message):
+    return encode_frame(GAME_OVER, seq, message.encode("utf-8"))
+
+
+def encode_ping(seq, msg_type=PING, clock=None):
+    if clock is None:
+        clock = time.monotonic_ns()
+    return encode_frame(msg_type, seq, PING_PAYLOAD.pack(clock))
+
+
+def decode_hello(payload):
+    """Returns ``(version, cols, rows)``."""
+    return HELLO_PAYLOAD.unpack(payload)
+
+
+def encode_snapshot(cols, rows, first, moves):
+    """Payload of a SNAPSHOT frame: ``moves`` are the columns from ``first`` on."""
+    return SNAPSHOT_HEADER.pack(cols, rows, first) + bytes(moves)
+
+
+def decode_start(payload):
+    """Returns ``(seat, cols, rows, match id, resume token)``."""
+    return START_PAYLOAD.unpack(payload)
+
+
+def decode_snapshot(payload):
+    """Returns ``(cols, rows, first, moves)``."""
+    cols, rows, first = SNAPSHOT_HEADER.unpack_from(payload)
+    return cols, rows, first, payload[SNAPSHOT_HEADER.size :]
+
+
+def decode_move(payload):
+    return MOVE_PAYLOAD.unpack(payload)[0]
+
+
+def decode_game_over(payload):
+    return bytes(payload).decode("utf-8")
+
+
+def decode_result(payload):
+    """Returns the winning seat, or NO_WINNER for a draw."""
+    return RESULT_PAYLOAD.unpack(payload)[0]
+
+
+def decode_error(payload):
+    return bytes(payload).decode("utf-8")
+
+
+def decode_ping(payload):
+    return PING_PAYLOAD.unpack(payload)[0]
+
+
+class FrameReader:
+    """Reassembles frames from a byte stream into one reusable buffer."""
+
+    def __init__(self, size=READ_BUFFER_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def make_room(self, needed):
+        """Moves unread bytes to the front, growing the buffer if required."""
+        unread = self.end - self.start
+        if self.start:
+            self.buffer[:unread] = self.buffer[self.start : self.end]
+            self.start, self.end = 0, unread
+        if len(self.buffer) - self.end < needed:
+            self.view.release()
+            self.buffer.extend(bytes(needed - (len(self.buffer) - self.end)))
+            self.view = memoryview(self.buffer)
+
+    def recv_from(self, sock):
+        """Reads whatever the socket has into the buffer.
+
+        Returns the number of bytes read, 0 once the peer has closed.
+        """
+        if self.end == len(self.buffer):
+            self.make_room(HEADER.size)
+        count = sock.recv_into(self.view[self.end :])
+        self.end += count
+        return count
+
+    def feed(self, data):
+        """Appends bytes received by other means (e.g. asyncio protocols)."""
+        if len(self.buffer) - self.end < len(data):
+            self.make_room(len(data))
+        self.buffer[self.end : self.end + len(data)] = data
+        self.end += len(data)
+
+    def frames(self):
+        """Yields every complete ``(type, seq, payload)`` frame buffered so far.
+
+        Payloads are ``bytes`` copies, so they stay valid after more data
+        is read into the buffer.
+        """
+        buffer = self.buffer
+        header_size = HEADER.size
+        while self.end - self.start >= header_size:
+            msg_type, seq, length = HEADER.unpack_from(buffer, self.start)
+            frame_end = self.start + header_size + length
+            if frame_end > self.end:
+                break
+            payload = bytes(self.view[self.start + header_size : frame_end])
+            self.start = frame_end
+            yield msg_type, seq, payload
+        if self.start == self.end:
+            self.start = self.end = 0
+
+
+class FramedConnection:
+    """A blocking socket that sends and receives numbered frames."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = FrameReader()
+        self.send_seq = 0
+        self.recv_seq = 0
+        self.send_lock = threading.Lock()
+        self.metrics = ConnectionMetrics()
+
+    def next_seq(self):
+        self.send_seq += 1
+        return self.send_seq
+
+    @timed("net.send")
+    def send(self, msg_type, payload=b""):
+        with self.send_lock:
+            frame = encode_frame(msg_type, self.next_seq(), payload)
+            self.sock.sendall(frame)
+        self.metrics.on_send(len(frame))
+
+    def send_hello(self, cols, rows):
+        self.send(HELLO, HELLO_PAYLOAD.pack(PROTOCOL_VERSION, cols, rows))
+
+    def send_move(self, col):
+        self.send(MOVE, MOVE_PAYLOAD.pack(col))
+
+    def send_game_over(self, message):
+        self.send(GAME_OVER, message.encode("utf-8"))
+
+    def send_watch(self, match_id=0):
+        self.send(WATCH, WATCH_PAYLOAD.pack(match_id))
+
+    def send_resume(self, token, moves_known):
+        self.send(RESUME, RESUME_PAYLOAD.pack(PROTOCOL_VERSION, token, moves_known))
+
+    def send_ping(self, msg_type=PING, clock=None):
+        if clock is None:
+            clock = time.monotonic_ns()
+        self.send(msg_type, PING_PAYLOAD.pack(clock))
+
+    def receive(self):
+        """Blocks until at least one frame arrives and returns the frames.
+
+        Returns an empty list once the peer has closed the connection and
+        raises ProtocolError when frames arrive out of order. A SNAPSHOT
+        carries the sequence number of the stream it starts or resyncs.
+        """
+        received = 0
+        while True:
+            count = self.reader.recv_from(self.sock)
+            if not count:
+                return []
+            received += count
+            frames = self.decode()
+            if frames:
+                self.metrics.on_receive(len(frames), received)
+                return frames
+
+    @timed("net.recv")
+    def decode(self):
+        """Parses and sequence-checks the complete frames read so far."""
+        frames = list(self.reader.frames())
+        for msg_type, seq, _ in frames:
+            if seq != self.recv_seq + 1 and msg_type != SNAPSHOT:
+                raise ProtocolError(f"Expected frame {self.recv_seq + 1}, got {seq}")
+            self.recv_seq = seq
+        return frames
+
+    def close(self):
+        self.sock.close()
+
+
+def benchmark(frames=200000, batch=64):
+    """Streams MOVE frames over a loopback TCP connection.
+
+    Returns ``(frames per second, megabytes per second)``.
+    """
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+
+    def send_all():
+        with socket.create_connection(("127.0.0.1", port)) as sender:
+            seq = 0
+            for _ in range(frames // batch):
+                chunk = bytearray()
+                for _ in range(batch):
+                    seq += 1
+                    chunk += encode_move(seq, seq % 7)
+                sender.sendall(chunk)
+
+    thread = threading.Thread(target=send_all)
+    start = time.perf_counter()
+    thread.start()
+    receiver, _ = server.accept()
+    connection = FramedConnection(receiver)
+    received = 0
+    expected = (frames // batch) * batch
+    while received < expected:
+        batch_frames = connection.receive()
+        if not batch_frames:
+            break
+        for msg_type, _, payload in batch_frames:
+            decode_move(payload)
+        received += len(batch_frames)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    connection.close()
+    server.close()
+    frame_size = HEADER.size + MOVE_PAYLOAD.size
+    return received / elapsed, received * frame_size / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire protocol loopback benchmark")
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+    frames_per_second, megabytes = benchmark(args.frames, args.batch)
+    print(f"{frames_per_second:,.0f} frames/s, {megabytes:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
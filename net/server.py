@@ -0,0 +1,431 @@
+"""Asyncio matchmaking server for online games.
+
+Clients connect and send HELLO with the board size they want to play. The
+lobby pairs waiting clients of the same size and sends each a START frame
+with their seat. From then on the server is the authority for the match:
+every MOVE is validated against the match's compact MatchState before it
+is relayed to the opponent, and the server pushes the RESULT once a move
+wins or fills the board.
+
+Other clients can WATCH a running match by id (0 for the latest one) and
+receive its moves read-only through the match's Broadcast.
+
+A player whose connection drops keeps their seat for GRACE_SECONDS. START
+hands each player a resume token; reconnecting with RESUME and the number
+of moves the client already has returns a SNAPSHOT of only the moves it
+missed, so the game carries on where it stopped.
+
+    python -m net.server --host 0.0.0.0 --port 4000
+
+The Tk client joins by choosing "Play 2 Players over IP", answering "No"
+to hosting and entering the server address.
+"""
+
+import argparse
+import asyncio
+import secrets
+import time
+from array import array
+from engine.game_state import MIN_SIZE, MAX_SIZE
+from net import protocol
+from net.broadcast import Broadcast
+from net.metrics import to_prometheus, write_prometheus
+from net.authority import MatchState, get_geometry, ILLEGAL, ONGOING, WIN
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Idle clients only ever receive a few small frames, so a small read
+# buffer keeps 10k connections cheap; FrameReader grows it when needed.
+CONNECTION_BUFFER_SIZE = 256
+LATENCY_SAMPLES = 4096
+GRACE_SECONDS = 30.0
+# Payload size of every fixed-layout message a client may send
+PAYLOAD_SIZES = {
+    protocol.HELLO: protocol.HELLO_PAYLOAD.size,
+    protocol.MOVE: protocol.MOVE_PAYLOAD.size,
+    protocol.PING: protocol.PING_PAYLOAD.size,
+    protocol.PONG: protocol.PING_PAYLOAD.size,
+    protocol.WATCH: protocol.WATCH_PAYLOAD.size,
+    protocol.RESUME: protocol.RESUME_PAYLOAD.size,
+}
+
+
+class ClientConnection(asyncio.Protocol):
+    """One client socket, decoded frame by frame into the lobby."""
+
+    def __init__(self, lobby):
+        self.lobby = lobby
+        self.transport = None
+        self.reader = protocol.FrameReader(CONNECTION_BUFFER_SIZE)
+        self.send_seq = 0
+        self.recv_seq = 0
+        self.size = None
+        self.match = None
+        self.seat = None
+        self.watching = None
+        self.lagging = False
+        self.greeted = False  # Set by the first HELLO, WATCH or RESUME
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.lobby.connected(self)
+
+    def data_received(self, data):
+        self.reader.feed(data)
+        for msg_type, seq, payload in self.reader.frames():
+            if seq != self.recv_seq + 1:
+                self.fail(f"Expected frame {self.recv_seq + 1}, got {seq}")
+                return
+            self.recv_seq = seq
+            self.lobby.handle(self, msg_type, payload)
+            if self.transport.is_closing():
+                return
+
+    def connection_lost(self, exc):
+        self.lobby.disconnected(self)
+
+    def pause_writing(self):
+        self.lagging = True
+
+    def resume_writing(self):
+        self.lagging = False
+        if self.watching is not None:
+            self.watching.broadcast.resync(self)
+
+    def send(self, msg_type, payload=b""):
+        self.send_seq += 1
+        self.transport.write(protocol.encode_frame(msg_type, self.send_seq, payload))
+
+    def fail(self, message):
+        """Reports a protocol violation and drops the client."""
+        self.send(protocol.ERROR, message.encode("utf-8"))
+        self.transport.close()
+
+
+class LatencyWindow:
+    """The most recent per-move validation latencies, in nanoseconds."""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = array("Q", bytes(8 * size))
+        self.count = 0
+        self.total = 0
+
+    def add(self, nanoseconds):
+        self.samples[self.count % len(self.samples)] = nanoseconds
+        self.count += 1
+        self.total += nanoseconds
+
+    def percentiles(self, *points):
+        recent = sorted(self.samples[: min(self.count, len(self.samples))])
+        if not recent:
+            return [0] * len(points)
+        return [recent[min(len(recent) - 1, len(recent) * p // 100)] for p in points]
+
+
+class Match:
+    __slots__ = (
+        "match_id",
+        "players",
+        "tokens",
+        "timers",
+        "state",
+        "broadcast",
+        "result",
+    )
+
+    def __init__(self, match_id, players, cols, rows):
+        self.match_id = match_id
+        # A seat is None while its player is away within the grace window
+        self.players = list(players)
+        self.tokens = tuple(secrets.token_bytes(protocol.TOKEN_BYTES) for _ in (0, 1))
+        self.timers = [None, None]
+        self.state = MatchState(get_geometry(cols, rows))
+        self.broadcast = Broadcast(self.state)
+        self.result = None  # RESULT payload once the game is over
+        for seat, client in enumerate(players):
+            client.match = self
+            client.seat = seat
+            client.send(
+                protocol.START,
+                protocol.START_PAYLOAD.pack(
+                    seat, cols, rows, match_id, self.tokens[seat]
+                ),
+            )
+
+    def send(self, seat, msg_type, payload=b""):
+        client = self.players[seat]
+        if client is not None:
+            client.send(msg_type, payload)
+
+    def play(self, client, col, latencies):
+        """Validates and relays a move; returns ILLEGAL, ONGOING, WIN or DRAW.
+
+        Illegal moves drop the client. When the game ends both players get
+        the RESULT right after the move.
+        """
+        if client.seat != self.state.moves & 1:
+            client.fail("Not your turn")
+            return ILLEGAL
+        start = time.perf_counter_ns()
+        result = self.state.play(col)
+        latencies.add(time.perf_counter_ns() - start)
+        if result == ILLEGAL:
+            client.fail(f"Illegal move {col}")
+            return result
+        payload = protocol.MOVE_PAYLOAD.pack(col)
+        self.send(client.seat ^ 1, protocol.MOVE, payload)
+        self.broadcast.publish(protocol.MOVE, payload)
+        if result != ONGOING:
+            winner = client.seat if result == WIN else protocol.NO_WINNER
+            self.result = protocol.RESULT_PAYLOAD.pack(winner)
+            for seat in (0, 1):
+                self.send(seat, protocol.RESULT, self.result)
+            self.broadcast.publish(protocol.RESULT, self.result, final=True)
+        return result
+
+
+class Lobby:
+    """Connected clients, the matchmaking queue and the running matches."""
+
+    def __init__(self):
+        self.clients = set()
+        # One waiting client per board size: the next one completes the pair
+        self.waiting = {}
+        self.matches = {}
+        self.next_match_id = 1
+        # Resume token -> match, kept while a player may still come back
+        self.sessions = {}
+        self.moves = 0
+        self.latencies = LatencyWindow()
+
+    def connected(self, client):
+        self.clients.add(client)
+
+    def disconnected(self, client):
+        self.clients.discard(client)
+        if self.waiting.get(client.size) is client:
+            del self.waiting[client.size]
+        if client.watching is not None:
+            client.watching.broadcast.unsubscribe(client)
+        match = client.match
+        if match is not None:
+            # Hold the seat; the game is forfeited if nobody resumes it
+            match.players[client.seat] = None
+            match.timers[client.seat] = asyncio.get_running_loop().call_later(
+                GRACE_SECONDS, self.abandon, match, client.seat
+            )
+
+    def abandon(self, match, seat):
+        match.timers[seat] = None
+        if match.players[seat] is not None:
+            return
+        if match.result is None:
+            match.send(seat ^ 1, protocol.RESIGN)
+            match.broadcast.publish(protocol.RESIGN, final=True)
+            self.end_match(match)
+        self.sessions.pop(match.tokens[seat], None)
+
+    def end_match(self, match):
+        self.matches.pop(match.match_id, None)
+        match.broadcast.close()
+        for seat, client in enumerate(match.players):
+            if client is not None:
+                client.match = None
+                client.transport.close()
+                self.sessions.pop(match.tokens[seat], None)
+            elif match.result is None:
+                # Forfeited: there is nothing left to resume
+                if match.timers[seat] is not None:
+                    match.timers[seat].cancel()
+                self.sessions.pop(match.tokens[seat], None)
+
+    def join(self, client, payload):
+        version, cols, rows = protocol.decode_hello(payload)
+        if version != protocol.PROTOCOL_VERSION:
+            client.fail(
+                f"Server speaks protocol {protocol.PROTOCOL_VERSION}, "
+                f"client speaks {version}"
+            )
+            return
+        if not (MIN_SIZE <= cols <= MAX_SIZE and MIN_SIZE <= rows <= MAX_SIZE):
+            client.fail(f"Unsupported board size {cols}x{rows}")
+            return
+        client.size = (cols, rows)
+        opponent = self.waiting.pop(client.size, None)
+        if opponent is None:
+            self.waiting[client.size] = client
+        else:
+            # The client who waited longest moves first
+            match_id = self.next_match_id
+            self.next_match_id += 1
+            match = Match(match_id, (opponent, client), cols, rows)
+            self.matches[match_id] = match
+            for token in match.tokens:
+                self.sessions[token] = match
+
+    def resume(self, client, payload):
+        """Gives a reconnecting player back their seat and the moves they missed.
+
+        If the game ended while they were away they get the RESULT as well.
+        """
+        version, token, moves_known = protocol.RESUME_PAYLOAD.unpack(payload)
+        match = self.sessions.get(token)
+        if version != protocol.PROTOCOL_VERSION or match is None:
+            client.fail("The game can no longer be resumed")
+            return
+        seat = match.tokens.index(token)
+        previous = match.players[seat]
+        if previous is not None:
+            # The old connection is half-open; the new one takes over
+            previous.match = None
+            previous.transport.close()
+        elif match.timers[seat] is not None:
+            match.timers[seat].cancel()
+            match.timers[seat] = None
+        match.players[seat] = client
+        client.match = match
+        client.seat = seat
+
+        state = match.state
+        first = min(moves_known, state.moves)
+        geometry = state.geometry
+        client.send(
+            protocol.SNAPSHOT,
+            protocol.encode_snapshot(
+                geometry.cols, geometry.rows, first, state.log[first:]
+            ),
+        )
+        if match.result is not None:
+            client.send(protocol.RESULT, match.result)
+            client.match = None
+            client.transport.close()
+            self.sessions.pop(token, None)
+
+    def watch(self, client, payload):
+        match_id = protocol.WATCH_PAYLOAD.unpack(payload)[0]
+        if match_id == 0 and self.matches:
+            match_id = max(self.matches)
+        match = self.matches.get(match_id)
+        if match is None:
+            client.fail(f"No running match {match_id}")
+            return
+        client.watching = match
+        match.broadcast.subscribe(client)
+
+    def handle(self, client, msg_type, payload):
+        match = client.match
+        size = PAYLOAD_SIZES.get(msg_type)
+        if size is not None and len(payload) != size:
+            client.fail(f"Malformed message type {msg_type}")
+            return
+        if msg_type in (protocol.HELLO, protocol.WATCH, protocol.RESUME):
+            # A connection introduces itself exactly once
+            if client.greeted:
+                client.fail("Already joined")
+                return
+            client.greeted = True
+        if client.watching is not None:
+            return  # Spectators are read-only
+        if msg_type == protocol.HELLO:
+            self.join(client, payload)
+        elif msg_type == protocol.WATCH:
+            self.watch(client, payload)
+        elif msg_type == protocol.RESUME:
+            self.resume(client, payload)
+        elif msg_type == protocol.PING:
+            client.send(protocol.PONG, payload)
+        elif msg_type == protocol.PONG:
+            pass
+        elif match is None:
+            client.fail("Not in a game")
+        elif msg_type == protocol.MOVE:
+            result = match.play(client, protocol.decode_move(payload), self.latencies)
+            if result != ILLEGAL:
+                self.moves += 1
+                if result != ONGOING:
+                    self.end_match(match)
+        elif msg_type == protocol.RESIGN:
+            match.send(client.seat ^ 1, protocol.RESIGN)
+            match.broadcast.publish(protocol.RESIGN, final=True)
+            self.end_match(match)
+        else:
+            client.fail(f"Unexpected message type {msg_type}")
+
+
+def raise_file_limit():
+    """Every connection is a file descriptor; lift the soft limit to the hard one."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def serve(host, port, lobby=None):
+    """Starts listening and returns ``(server, lobby)``."""
+    lobby = lobby or Lobby()
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(
+        lambda: ClientConnection(lobby), host, port, backlog=4096
+    )
+    return server, lobby
+
+
+def lobby_metrics(lobby):
+    latencies = lobby.latencies
+    p50, p99 = latencies.percentiles(50, 99)
+    return {
+        "clients": len(lobby.clients),
+        "waiting_clients": len(lobby.waiting),
+        "matches": len(lobby.matches),
+        "moves_total": lobby.moves,
+        "validation_seconds": {
+            "0.5": p50 / 1e9,
+            "0.99": p99 / 1e9,
+            "sum": latencies.total / 1e9,
+            "count": latencies.count,
+        },
+    }
+
+
+async def run(host, port, report_interval, metrics_file=None):
+    server, lobby = await serve(host, port)
+    print(f"Listening on {host}:{port}")
+    async with server:
+        moves = 0
+        while True:
+            await asyncio.sleep(report_interval)
+            rate = (lobby.moves - moves) / report_interval
+            moves = lobby.moves
+            p50, p99 = lobby.latencies.percentiles(50, 99)
+            print(
+                f"{len(lobby.clients)} clients, {len(lobby.waiting)} waiting, "
+                f"{len(lobby.matches)} matches, {rate:.0f} moves/s, "
+                f"validation p50 {p50 / 1000:.1f} us p99 {p99 / 1000:.1f} us"
+            )
+            if metrics_file:
+                text = to_prometheus(lobby_metrics(lobby), prefix="connect4_server_")
+                write_prometheus(metrics_file, text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connect Four matchmaking server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument(
+        "--metrics-file", help="write Prometheus text metrics here every report"
+    )
+    args = parser.parse_args()
+    raise_file_limit()
+    try:
+        asyncio.run(run(args.host, args.port, args.report_interval, args.metrics_file))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ from contants.app_styles import setup_styles
 from contants.app_const import WINDOW_SIZE
 import db.database as database
 
+STANDINGS_SHOWN = 5
+
 
 def show_home_screen(
     window,
@@ -10,10 +12,13 @@ def show_home_screen(
     start_game_callback,
     start_bot_game_callback,
     start_online_game_callback,
+    start_replay_callback,
 ):
     styles = setup_styles()
     clear_window(window)
     rank = database.get_user_rank(username)
+    position = database.get_user_position(username)
+    top_players = database.get_top_players()[:STANDINGS_SHOWN]
 
     window.geometry(WINDOW_SIZE)
     window.grid_rowconfigure(0, weight=1)
@@ -31,7 +36,7 @@ def show_home_screen(
     )
     greeting_label.grid(row=0, column=0, sticky="ew", padx=50, pady=20)
 
-    frame.grid_rowconfigure(5, weight=1)
+    frame.grid_rowconfigure(8, weight=1)
     frame.grid_columnconfigure(0, weight=1)
 
     Button(
@@ -58,6 +63,22 @@ def show_home_screen(
         fg=styles["buttonFgColor"],
         command=lambda: play_over_ip(start_online_game_callback, username),
     ).grid(row=3, column=0, sticky="ew", padx=50)
+    Button(
+        frame,
+        text="Watch a Game over IP",
+        font=styles["fontLarge"],
+        bg=styles["buttonColor"],
+        fg=styles["buttonFgColor"],
+        command=lambda: watch_over_ip(start_online_game_callback, username),
+    ).grid(row=4, column=0, sticky="ew", padx=50, pady=10)
+    Button(
+        frame,
+        text="Replay a Game",
+        font=styles["fontLarge"],
+        bg=styles["buttonColor"],
+        fg=styles["buttonFgColor"],
+        command=lambda: start_replay_callback(username),
+    ).grid(row=5, column=0, sticky="ew", padx=50)
 
     rank_label = Label(
         frame,
@@ -66,7 +87,23 @@ def show_home_screen(
         bg=styles["bgColor"],
         fg=styles["fgColor"],
     )
-    rank_label.grid(row=4, column=0, sticky="ew", padx=50, pady=20)
+    rank_label.grid(row=6, column=0, sticky="ew", padx=50, pady=20)
+
+    standings = [
+        f"{place}. {name} - {points}"
+        for place, (_, name, points) in enumerate(top_players, start=1)
+    ]
+    if position is not None:
+        standings.append(f"Your position: #{position}")
+    standings_label = Label(
+        frame,
+        text="\n".join(standings),
+        font=styles["fontInput"],
+        bg=styles["bgColor"],
+        fg=styles["fgColor"],
+        justify="left",
+    )
+    standings_label.grid(row=7, column=0, sticky="ew", padx=50)
 
 
 def clear_window(window):
@@ -79,8 +116,17 @@ def play_vs_bot(start_bot_game_callback, username):
     size = simpledialog.askinteger(
         "Board Size", "Enter the board size (4-10):", minvalue=4, maxvalue=10
     )
-    if size:
-        start_bot_game_callback(size, username)
+    if not size:
+        return
+    difficulty = simpledialog.askinteger(
+        "Difficulty",
+        "Enter the bot difficulty (1-6):",
+        minvalue=1,
+        maxvalue=6,
+        initialvalue=3,
+    )
+    if difficulty:
+        start_bot_game_callback(size, username, difficulty)
 
 
 def play_local_multiplayer(start_game_callback, username):
@@ -107,7 +153,33 @@ def play_over_ip(start_online_game_callback, username):
             "Enter the host address in the format ip:port",
             initialvalue="127.0.0.1:4000",
         )
+        if not client_address:
+            return
         ip, port = client_address.split(":")
         port = int(port)
-        if client_address:
-            start_online_game_callback(False, 6, ip, port, username)
+        # Only used by matchmaking servers, a peer host picks the size itself
+        size = simpledialog.askinteger(
+            "Board Size",
+            "Enter the board size (4-10):",
+            minvalue=4,
+            maxvalue=10,
+            initialvalue=6,
+        )
+        if size:
+            start_online_game_callback(False, size, ip, port, username)
+
+
+def watch_over_ip(start_online_game_callback, username):
+    server_address = simpledialog.askstring(
+        "Watch a Game",
+        "Enter the server address in the format ip:port",
+        initialvalue="127.0.0.1:4000",
+    )
+    if not server_address:
+        return
+    ip, port = server_address.split(":")
+    match_id = simpledialog.askinteger(
+        "Watch a Game", "Enter the game number (0 for the latest game):", minvalue=0
+    )
+    if match_id is not None:
+        start_online_game_callback(False, 6, ip, int(port), username, match_id)